@@ -0,0 +1 @@
+"""Benchmarks of the maup_tools cores on deterministic synthetic data."""
@@ -0,0 +1,59 @@
+"""Compare two benchmark result files case by case.
+
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+
+Exits with status 1 if any case is slower than the tolerance allows.
+"""
+import argparse
+import json
+import sys
+
+
+def _load(path):
+    with open(path) as f:
+        document = json.load(f)
+    return {(r["case"], r["scale"]): r for r in document["results"] if r["status"] == "ok"}
+
+def compare(baseline, candidate, tolerance=0.1):
+    """Return a row per case measured in both runs, and whether any case regressed beyond the tolerance."""
+    rows, regressed = [], False
+    for key in sorted(baseline.keys() & candidate.keys()):
+        old, new = baseline[key], candidate[key]
+        ratio = new["median_seconds"] / old["median_seconds"] if old["median_seconds"] else float("inf")
+        slower = ratio > 1 + tolerance
+        regressed |= slower
+        rows.append({
+            "case": key[0], "scale": key[1],
+            "old_seconds": old["median_seconds"], "new_seconds": new["median_seconds"], "time_ratio": ratio,
+            "old_peak_rss_mb": old["peak_rss_mb"], "new_peak_rss_mb": new["peak_rss_mb"],
+            # Results from before worker memory was recorded have none
+            "old_worker_peak_rss_mb": old.get("worker_peak_rss_mb", 0.0),
+            "new_worker_peak_rss_mb": new.get("worker_peak_rss_mb", 0.0),
+            "regressed": slower,
+        })
+    return rows, regressed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.compare", description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed fractional slowdown of the median time")
+    parser.add_argument("--json", action="store_true", help="print the comparison as JSON")
+    args = parser.parse_args(argv)
+
+    rows, regressed = compare(_load(args.baseline), _load(args.candidate), args.tolerance)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        for row in rows:
+            flag = "  SLOWER" if row["regressed"] else ""
+            workers = (f"  workers {row['old_worker_peak_rss_mb']:8.1f} -> {row['new_worker_peak_rss_mb']:8.1f} MB"
+                       if row["old_worker_peak_rss_mb"] or row["new_worker_peak_rss_mb"] else "")
+            print(f"{row['scale']:>7} {row['case']:<16} {row['old_seconds']:9.3f} s -> {row['new_seconds']:9.3f} s "
+                  f"({row['time_ratio']:5.2f}x)  {row['old_peak_rss_mb']:8.1f} -> {row['new_peak_rss_mb']:8.1f} MB"
+                  f"{workers}{flag}")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Deterministic synthetic inputs for the benchmarks, at several scales.
+
+Every generator writes its file in chunks, seeding the random numbers of
+each chunk from the chunk position, so the same scale always gives the same
+bytes and multi-GB inputs never have to fit in memory.
+"""
+import os
+
+import numpy as np
+
+SEED = 20240601
+
+# Size of each input per scale: raster side in cells, CSV rows, log timesteps and mesh triangles
+SCALES = {
+    "small": {"raster": 1024, "rows": 10_000, "log_lines": 10_000, "triangles": 10_000},
+    "medium": {"raster": 8192, "rows": 1_000_000, "log_lines": 1_000_000, "triangles": 1_000_000},
+    "large": {"raster": 23_170, "rows": 5_000_000, "log_lines": 5_000_000, "triangles": 4_000_000},
+    "xlarge": {"raster": 32_768, "rows": 20_000_000, "log_lines": 20_000_000, "triangles": 10_000_000},
+}
+
+CHUNK_ROWS = 1_000_000
+NODATA = -9999.0
+
+
+def _rng(*position):
+    return np.random.default_rng([SEED, *position])
+
+def _write_raster(path, side, fill_block):
+    """Write a square tiled float32 GeoTIFF, one strip of tiles at a time."""
+    import rasterio
+    from rasterio.transform import from_origin
+    from rasterio.windows import Window
+
+    profile = {
+        "driver": "GTiff", "width": side, "height": side, "count": 1, "dtype": "float32",
+        "crs": "EPSG:27700", "transform": from_origin(400_000.0, 300_000.0 + 2.0 * side, 2.0, 2.0),
+        "nodata": NODATA, "tiled": True, "blockxsize": 512, "blockysize": 512, "BIGTIFF": "IF_SAFER",
+    }
+    with rasterio.open(path + ".part", "w", **profile) as dst:
+        for row_off in range(0, side, 512):
+            height = min(512, side - row_off)
+            block = fill_block(_rng(row_off), (height, side)).astype(np.float32)
+            # About 5% of the cells are nodata, as outside a model domain
+            block[_rng(row_off, 1).random((height, side)) < 0.05] = NODATA
+            dst.write(block, 1, window=Window(0, row_off, side, height))
+    os.replace(path + ".part", path)
+
+def stage_difference_raster(path, side):
+    """Peak stage differences centred on zero, mostly within a few centimetres."""
+    _write_raster(path, side, lambda rng, shape: rng.normal(0.0, 0.08, shape))
+
+def depth_raster(path, side):
+    """Depths that are mostly shallow, with dry and a few negative cells."""
+    def fill(rng, shape):
+        depths = rng.gamma(0.8, 0.4, shape)
+        depths[rng.random(shape) < 0.3] = 0.0
+        depths[rng.random(shape) < 0.01] *= -0.01
+        return depths
+    _write_raster(path, side, fill)
+
+def _write_csv(path, header, rows, fill_chunk):
+    with open(path + ".part", "w", newline="") as f:
+        f.write(",".join(header) + "\n")
+        for start in range(0, rows, CHUNK_ROWS):
+            chunk = fill_chunk(_rng(start), start, min(CHUNK_ROWS, rows - start))
+            np.savetxt(f, chunk, delimiter=",", fmt="%.9g")
+    os.replace(path + ".part", path)
+
+def mass_balance_csv(path, rows):
+    """A TUFLOW MB.csv with a 30 s output interval and a slowly drifting cumulative mass error."""
+    header = ["Time (h)", " Q In", " Q Out", " Vol I", " dVol", " ME (%)", " Cum Vol I", " Cum ME (%)"]
+
+    def fill(rng, start, n):
+        time = (start + np.arange(n)) * 30 / 3600
+        q_in = 50 + 40 * np.sin(time / 3)
+        q_out = q_in * (0.98 + 0.02 * rng.random(n))
+        d_vol = (q_in - q_out) * 30
+        me = rng.normal(0.0, 0.05, n)
+        cum_me = 0.5 * np.sin(time / 7) + rng.normal(0.0, 0.01, n)
+        return np.column_stack([time, q_in, q_out, q_in * 30, d_vol, me, time * 1.0e4, cum_me])
+
+    _write_csv(path, header, rows, fill)
+
+def courant_csv(path, rows):
+    """A TUFLOW HPC.dt.csv with adaptive timesteps and occasional Courant number spikes."""
+    header = ["Timestep", " Time (h)", " dt", " dtStar", " Nu", " Nc", " Nd", " Wet cells"]
+
+    def fill(rng, start, n):
+        dt_star = rng.uniform(0.5, 2.0, n)
+        nu = rng.uniform(0.2, 0.9, n)
+        nc = rng.uniform(0.1, 0.8, n)
+        nd = rng.uniform(0.0, 0.25, n)
+        # Roughly one spike above the thresholds per 10,000 timesteps
+        for column, peak in ((nu, 1.5), (nc, 1.2), (nd, 0.4)):
+            spikes = rng.random(n) < 1e-4
+            column[spikes] = peak
+        timestep = start + np.arange(n)
+        return np.column_stack([timestep, timestep * 1.25 / 3600, dt_star * 0.8, dt_star, nu, nc, nd,
+                                rng.integers(10_000, 20_000, n)])
+
+    _write_csv(path, header, rows, fill)
+
+def sim_log(path, lines):
+    """An InfoWorks ICM SIM.log with every line the log check reads, around many timestep lines."""
+    header = [
+        "InfoWorks ICM SIM 2024.2.0 (benchmark)",
+        "Network: Benchmark network (1)",
+        "Network Scenario: Base",
+        "Inflow: Inflow group > Benchmark inflow",
+        "Level: Level group > Benchmark level",
+        "Rainfall event: Rainfall group > 100yr 6hr",
+        "Event details: Synthetic benchmark event",
+        "Start time - 01/01/2024 00:00:00",
+        "Requested duration (min) - 360",
+        "Minimum element area (m2) : 1.000",
+        "Maximum element area (m2) : 25.000",
+        "Minimum element area (m2) : 1.250",
+        "External Boundary Condition : Normal condition",
+        "GPU used successfully",
+    ]
+    footer = [
+        "2d Zone mass error (m3) : 0.123",
+        "VBEP -> Volume balance error % : -0.012",
+        "Elapsed clock time = 1234s",
+    ]
+    with open(path + ".part", "w") as f:
+        f.write("\n".join(header) + "\n")
+        for start in range(0, lines, CHUNK_ROWS):
+            n = min(CHUNK_ROWS, lines - start)
+            minutes = (start + np.arange(n)) * 0.5
+            iterations = _rng(start).integers(1, 12, n)
+            f.writelines(f"Timestep: {m:.2f}min  Iterations: {i}  Max change: 0.0012\n"
+                         for m, i in zip(minutes, iterations))
+        f.write("\n".join(footer) + "\n")
+    os.replace(path + ".part", path)
+
+def zones_shapefile(path, triangles):
+    """An ICM 2D Zones.shp of right triangles on a regular grid, with a third of the elements dry."""
+    import geopandas as gpd
+    import pyogrio
+    import shapely
+
+    squares = -(-triangles // 2)
+    side = int(np.ceil(np.sqrt(squares)))
+    part = os.path.join(os.path.dirname(path), "part_" + os.path.basename(path))
+    for start in range(0, triangles, CHUNK_ROWS):
+        n = min(CHUNK_ROWS, triangles - start)
+        index = start + np.arange(n)
+        square, upper = index // 2, index % 2
+        x = 400_000.0 + (square % side) * 5.0
+        y = 300_000.0 + (square // side) * 5.0
+        # Lower triangles take the bottom-right corner, upper triangles the top-left corner
+        corner_x = np.where(upper == 1, x, x + 5.0)
+        corner_y = np.where(upper == 1, y + 5.0, y)
+        coords = np.stack([np.column_stack([x, y]), np.column_stack([corner_x, corner_y]),
+                           np.column_stack([x + 5.0, y + 5.0]), np.column_stack([x, y])], axis=1)
+        rng = _rng(start)
+        depth = rng.gamma(0.8, 0.4, n)
+        depth[rng.random(n) < 1 / 3] = 0.0
+        gdf = gpd.GeoDataFrame({
+            "DEPTH2D": depth,
+            "SPEED2D": rng.gamma(1.5, 0.3, n),
+            "MAXANGLE2D": rng.uniform(0.0, 2 * np.pi, n),
+            "elevation2": 10.0 + y / 1e5 + depth,
+        }, geometry=shapely.polygons(coords), crs="EPSG:27700")
+        pyogrio.write_dataframe(gdf, part, append=start > 0)
+    # Rename every sidecar of the finished shapefile into place
+    base, _ = os.path.splitext(part)
+    for name in os.listdir(os.path.dirname(path)):
+        full = os.path.join(os.path.dirname(path), name)
+        if os.path.splitext(full)[0] == base:
+            os.replace(full, os.path.splitext(path)[0] + os.path.splitext(name)[1])
+
+# Name of each input, its file name, its generator and the scale size it takes
+INPUTS = {
+    "stage_difference": ("stage_difference.tif", stage_difference_raster, "raster"),
+    "depth": ("depth.tif", depth_raster, "raster"),
+    "mass_balance": ("run_MB.csv", mass_balance_csv, "rows"),
+    "courant": ("run_HPC.dt.csv", courant_csv, "rows"),
+    "sim_log": ("SIM.log", sim_log, "log_lines"),
+    "zones": (os.path.join("zones", "run", "2D Zones.shp"), zones_shapefile, "triangles"),
+}
+
+
+def ensure_input(data_dir, name, scale):
+    """Return the path of a synthetic input, generating it the first time it is asked for."""
+    file_name, generator, size_key = INPUTS[name]
+    path = os.path.join(data_dir, scale, file_name)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        generator(path, SCALES[scale][size_key])
+    return path
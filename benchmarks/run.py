@@ -0,0 +1,213 @@
+"""Time and memory-profile the maup_tools cores on synthetic inputs.
+
+Every case runs in a fresh interpreter, so its peak resident memory and
+import time are its own; the largest process pool worker of a case is
+recorded separately. Results are written as JSON with the machine,
+Python and package versions, for comparison with benchmarks.compare.
+
+    python -m benchmarks.run --scale small medium --repeat 3
+"""
+import argparse
+import datetime
+import importlib
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from .generate import SCALES, ensure_input
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _histogram(paths, workdir):
+    from maup_tools.stats import summarise_raster
+    summarise_raster(paths["stage_difference"], [-100, -0.1, -0.05, -0.01, 0.01, 0.05, 0.1, 100], (0.01, 0.05, 0.1))
+
+def _batch_histogram(paths, workdir):
+    from maup_tools.histogram import batch_histogram_percentages
+    batch_histogram_percentages([paths["stage_difference"], paths["depth"]], [-100, -0.1, 0, 0.1, 100])
+
+def _quicklook(paths, workdir):
+    from maup_tools.quicklook import read_quicklook
+    read_quicklook(paths["stage_difference"])
+
+def _volume(paths, workdir):
+    from maup_tools.volume import calculate_volume
+    calculate_volume(paths["depth"])
+
+def _stage_storage(paths, workdir):
+    from maup_tools.volume import stage_storage_curve
+    stage_storage_curve(paths["depth"], interval=0.05)
+
+def _mass_balance(paths, workdir):
+    from maup_tools.tuflow import read_mass_balance, summarise_mass_balance
+    summarise_mass_balance(read_mass_balance(paths["mass_balance"]))
+
+def _courant(paths, workdir):
+    from maup_tools.tuflow import courant_events, read_courant
+    courant_events(read_courant(paths["courant"]))
+
+def _log(paths, workdir):
+    from maup_tools.icm_log import read_log_info
+    read_log_info(paths["sim_log"])
+
+def _rating_curve(paths, workdir):
+    from maup_tools.rating import generate_rating_curve
+    generate_rating_curve(1.0, 0.01, 0.013, 10.0, num_points=100_000)
+
+def _vectors(paths, workdir):
+    from maup_tools.vectors import process_shapefile
+    process_shapefile(paths["zones"], os.path.join(workdir, "points.shp"))
+
+def _vector_grid(paths, workdir):
+    from maup_tools.vectors import grid_vectors
+    grid_vectors(paths["zones"], os.path.join(workdir, "grid.gpkg"), 25.0)
+
+def _rasterize(paths, workdir):
+    from maup_tools.rasterize import rasterize_shapefiles
+    zones_folder = os.path.dirname(os.path.dirname(paths["zones"]))
+    rasterize_shapefiles([zones_folder], workdir, ["DEPTH2D", "elevation2"], 2.0)
+
+# Each case: its core function, the inputs it reads, and the module it imports, timed separately
+CASES = {
+    "histogram": (_histogram, ["stage_difference"], "maup_tools.stats"),
+    "batch_histogram": (_batch_histogram, ["stage_difference", "depth"], "maup_tools.histogram"),
+    "quicklook": (_quicklook, ["stage_difference"], "maup_tools.quicklook"),
+    "volume": (_volume, ["depth"], "maup_tools.volume"),
+    "stage_storage": (_stage_storage, ["depth"], "maup_tools.volume"),
+    "mass_balance": (_mass_balance, ["mass_balance"], "maup_tools.tuflow"),
+    "courant": (_courant, ["courant"], "maup_tools.tuflow"),
+    "log": (_log, ["sim_log"], "maup_tools.icm_log"),
+    "rating_curve": (_rating_curve, [], "maup_tools.rating"),
+    "vectors": (_vectors, ["zones"], "maup_tools.vectors"),
+    "vector_grid": (_vector_grid, ["zones"], "maup_tools.vectors"),
+    "rasterize": (_rasterize, ["zones"], "maup_tools.rasterize"),
+}
+
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (2**20 if sys.platform == "darwin" else 2**10)
+
+def _stop_forkserver():
+    # Pool workers are children of the fork server, so they only count as children of this process once the
+    # server has reaped them and exited. multiprocessing has no public way to stop it, so the private method is
+    # used where it exists; without it the workers are never counted and worker_peak_rss_mb stays 0
+    from multiprocessing import forkserver
+    stop = getattr(getattr(forkserver, "_forkserver", None), "_stop", None)
+    if stop is not None:
+        stop()
+
+def run_child(case, paths, repeat):
+    """Run one case in this interpreter and return its measurements."""
+    function, _, module = CASES[case]
+    start = time.perf_counter()
+    importlib.import_module(module)
+    import_seconds = time.perf_counter() - start
+    baseline = _peak_rss_mb()
+    seconds, cpu_seconds = [], []
+    with tempfile.TemporaryDirectory() as workdir:
+        for i in range(repeat):
+            run_dir = os.path.join(workdir, str(i))
+            os.makedirs(run_dir)
+            start, cpu_start = time.perf_counter(), time.process_time()
+            function(paths, run_dir)
+            seconds.append(time.perf_counter() - start)
+            cpu_seconds.append(time.process_time() - cpu_start)
+    _stop_forkserver()
+    return {
+        "import_seconds": import_seconds,
+        "seconds": seconds,
+        "cpu_seconds": cpu_seconds,
+        "baseline_rss_mb": baseline,
+        "peak_rss_mb": _peak_rss_mb(),
+        # The largest of the worker processes of the cases that use a process pool
+        "worker_peak_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+def run_case(case, scale, data_dir, repeat):
+    """Generate the inputs of a case and run it in a fresh interpreter."""
+    result = {"case": case, "scale": scale, "repeat": repeat}
+    paths = {name: ensure_input(data_dir, name, scale) for name in CASES[case][1]}
+    result["input_bytes"] = sum(os.path.getsize(path) for path in paths.values())
+    command = [sys.executable, "-m", "benchmarks.run", "--child", case, json.dumps(paths), "--repeat", str(repeat)]
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [os.path.dirname(HERE), os.environ.get("PYTHONPATH")]))}
+    completed = subprocess.run(command, capture_output=True, text=True, env=env)
+    if completed.returncode != 0:
+        return {**result, "status": "failed", "reason": completed.stderr.strip().splitlines()[-1:]}
+    measurements = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {**result, "status": "ok", **measurements, "min_seconds": min(measurements["seconds"]),
+            "median_seconds": statistics.median(measurements["seconds"])}
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=HERE, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment():
+    """Describe the machine and the versions the results were measured with."""
+    from importlib import metadata
+
+    versions = {}
+    for package in ("numpy", "pandas", "rasterio", "geopandas", "pyogrio", "pyarrow", "matplotlib"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "packages": versions,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.splitlines()[0])
+    parser.add_argument("--case", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--scale", nargs="+", choices=list(SCALES), default=["small"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data-dir", default=os.path.join(HERE, "data"),
+                        help="where the synthetic inputs are generated and kept between runs")
+    parser.add_argument("--output", help="JSON file to write; a timestamped file in benchmarks/results by default")
+    parser.add_argument("--child", nargs=2, metavar=("CASE", "PATHS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        case, paths = args.child
+        print(json.dumps(run_child(case, json.loads(paths), args.repeat)))
+        return 0
+
+    results = []
+    for scale in args.scale:
+        for case in args.case:
+            result = run_case(case, scale, args.data_dir, args.repeat)
+            results.append(result)
+            if result["status"] == "ok":
+                workers = f" (workers {result['worker_peak_rss_mb']:.1f} MB)" if result["worker_peak_rss_mb"] else ""
+                print(f"{scale:>7} {case:<16} {result['median_seconds']:9.3f} s {result['peak_rss_mb']:9.1f} MB{workers}")
+            else:
+                print(f"{scale:>7} {case:<16} {result['status']}: {result['reason']}")
+
+    output = args.output or os.path.join(
+        HERE, "results", datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+    print(f"Results written to {output}")
+    return 1 if any(result["status"] == "failed" for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Computational cores shared by the Streamlit pages."""
@@ -0,0 +1,228 @@
+import glob
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def content_digest(buffer):
+    """Hash a bytes-like object without copying it."""
+    return hashlib.blake2b(buffer, digest_size=16).hexdigest()
+
+def file_identity(path):
+    """Identify a server-side file by its real path, size and modification time."""
+    stat = os.stat(path)
+    return (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+
+def layer_identity(path):
+    """Identify a vector layer by the file_identity of its file and of the sidecars sharing its name, such as a shapefile's .dbf and .prj."""
+    root = os.path.splitext(path)[0]
+    sidecars = sorted(set(glob.glob(glob.escape(root) + ".*")) - {path})
+    return (file_identity(path),) + tuple(file_identity(sidecar) for sidecar in sidecars)
+
+def path_digest(path):
+    """Hash a server-side file through a memory map, reusing the hash while its size and mtime are unchanged."""
+    identity = file_identity(path)
+    digest = _path_digests.get(identity)
+    if digest is None:
+        if identity[1] == 0:
+            digest = content_digest(b"")
+        else:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest = content_digest(mapped)
+        _path_digests.put(identity, digest)
+    return digest
+
+def source_digest(source):
+    """Hash an uploaded file or a server-side path by its contents."""
+    if isinstance(source, (str, os.PathLike)):
+        return path_digest(source)
+    return content_digest(source.getbuffer())
+
+def estimate_nbytes(value):
+    """Estimate the memory held by a cached value."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v) for v in value)
+    if hasattr(value, "__dict__"):
+        return sys.getsizeof(value) + estimate_nbytes(vars(value))
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """Thread-safe LRU cache bounded by the estimated size of its values."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        nbytes = estimate_nbytes(value)
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            # Evict the least recently used values until the cache fits
+            while self.nbytes > self.max_bytes:
+                self.nbytes -= self._entries.popitem(last=False)[1][1]
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing and caching it on a miss."""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+# Hashes of server-side files by identity, bounded as a long-running server sees many versions of the same files;
+# a digest takes about 80 bytes, so this keeps the hashes of about 13,000 files
+_path_digests = ResultCache(max_bytes=2**20)
+
+
+class ColumnStore:
+    """LRU cache of parsed tables on disk, bounded by the size of its files.
+
+    Each table is stored as a directory holding one .npy file per column,
+    which is read back through a memory map, so a hit costs little more than
+    opening the files. Entries are written to a temporary directory and
+    renamed into place, so sessions and processes can share the store.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Evicted entries that could not be deleted yet, retried on every eviction
+        self._undeleted = set()
+
+    def _entry(self, key):
+        return os.path.join(self.directory, content_digest(repr(key).encode()))
+
+    def get(self, key):
+        """Return the cached table for key, or None on a miss."""
+        entry = self._entry(key)
+        try:
+            with open(os.path.join(entry, "columns.json")) as f:
+                names = json.load(f)
+            columns = {name: np.load(os.path.join(entry, f"{i}.npy"), mmap_mode="r")
+                       for i, name in enumerate(names)}
+            # Mark the entry as recently used
+            os.utime(entry)
+        except (OSError, ValueError):
+            return None
+        return pd.DataFrame(columns, copy=False)
+
+    def put(self, key, df):
+        """Store a table, skipping tables with columns that cannot be memory mapped."""
+        if df.columns.duplicated().any() or any(dtype == object for dtype in df.dtypes):
+            return
+        entry = self._entry(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            staging = tempfile.mkdtemp(prefix=".staging-", dir=self.directory)
+            for i, name in enumerate(df.columns):
+                np.save(os.path.join(staging, f"{i}.npy"), df[name].to_numpy())
+            with open(os.path.join(staging, "columns.json"), "w") as f:
+                json.dump([str(name) for name in df.columns], f)
+            try:
+                os.rename(staging, entry)
+            except OSError:
+                # Another session stored the same table first
+                shutil.rmtree(staging, ignore_errors=True)
+        except OSError:
+            return
+        self.evict()
+
+    @staticmethod
+    def _delete(path):
+        """Delete an entry, returning whether it is gone.
+
+        Windows cannot delete files that are still memory mapped, so an entry
+        read by a live DataFrame stays until that DataFrame is released.
+        """
+        try:
+            shutil.rmtree(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return not os.path.exists(path)
+        return True
+
+    def evict(self):
+        """Delete the least recently used entries until the store fits its size limit.
+
+        Entries that cannot be deleted still count towards the limit, so the
+        next least recently used entries are deleted in their place, and
+        they are retried on the next eviction.
+        """
+        with self._lock:
+            self._undeleted = {path for path in self._undeleted if not self._delete(path)}
+            entries = []
+            with os.scandir(self.directory) as it:
+                for item in it:
+                    if item.is_dir() and not item.name.startswith("."):
+                        try:
+                            size = sum(f.stat().st_size for f in os.scandir(item.path))
+                            entries.append((item.stat().st_mtime_ns, size, item.path))
+                        except OSError:
+                            # Evicted by another process meanwhile
+                            continue
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path in self._undeleted:
+                    continue
+                if self._delete(path):
+                    total -= size
+                else:
+                    self._undeleted.add(path)
+
+    def get_or_parse(self, key, parse):
+        """Return the cached table for key, parsing and storing it on a miss."""
+        df = self.get(key)
+        if df is None:
+            df = parse()
+            self.put(key, df)
+        return df
@@ -0,0 +1,219 @@
+"""Command-line entry point for running the checks without the Streamlit app.
+
+Each subcommand imports only the modules it needs, so that the light checks
+(such as the log check) start quickly.
+"""
+import argparse
+import csv
+import json
+import sys
+
+
+def _is_csv(output):
+    return bool(output) and output.lower().endswith(".csv")
+
+def _json_default(value):
+    # NumPy scalars and anything else the json module does not know
+    return value.item() if hasattr(value, "item") else str(value)
+
+def write_result(result, output=None):
+    """Write a DataFrame, a list of rows or a dictionary as CSV or JSON, to a file or to stdout.
+
+    The format follows the extension of the output path; stdout gets JSON.
+    """
+    stream = open(output, "w", newline="") if output else sys.stdout
+    try:
+        if _is_csv(output):
+            if hasattr(result, "to_csv"):
+                result.to_csv(stream, index=False)
+            else:
+                rows = [result] if isinstance(result, dict) else list(result)
+                writer = csv.DictWriter(stream, fieldnames=list(rows[0]) if rows else [])
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            if hasattr(result, "to_dict"):
+                result = result.to_dict(orient="records")
+            json.dump(result, stream, indent=2, default=_json_default)
+            stream.write("\n")
+    finally:
+        if output:
+            stream.close()
+
+def _report_errors(errors):
+    for name, error in errors.items():
+        print(f"File {name} could not be read: {error}.", file=sys.stderr)
+    return 1 if errors else 0
+
+def _floats(text):
+    return [float(value) for value in text.split(",") if value.strip()]
+
+def run_mass_balance(args):
+    from .tuflow import bulk_mass_balance
+
+    summary, _, errors = bulk_mass_balance(args.files, args.threshold)
+    write_result(summary, args.output)
+    return _report_errors(errors)
+
+def run_courant(args):
+    from .tuflow import bulk_courant
+
+    summary, events, _, errors = bulk_courant(args.files)
+    write_result(summary, args.output)
+    if args.events:
+        write_result(events, args.events)
+    return _report_errors(errors)
+
+def run_histogram(args):
+    from .stats import histogram_report, summarise_raster
+
+    summary = summarise_raster(args.raster, _floats(args.bins), _floats(args.thresholds))
+    report = histogram_report(summary)
+    write_result(report["bins"] if _is_csv(args.output) else report, args.output)
+    return 0
+
+def run_volume(args):
+    from .volume import calculate_volume
+
+    write_result(calculate_volume(args.raster, zones=args.zones, zone_field=args.zone_field), args.output)
+    return 0
+
+def run_stage_storage(args):
+    from .volume import stage_storage_curve
+
+    write_result(stage_storage_curve(args.raster, args.interval, args.water_level), args.output)
+    return 0
+
+def run_rating_curve(args):
+    from .rating import generate_rating_curve
+
+    df = generate_rating_curve(args.diameter, args.slope, args.manning_n, args.invert_level, args.points)
+    write_result(df, args.output)
+    return 0
+
+def run_log(args):
+    from .icm_log import read_log_info
+
+    head_tail = not args.full_scan
+    write_result([{"File": path, **read_log_info(path, head_tail)} for path in args.files], args.output)
+    return 0
+
+def run_log_audit(args):
+    from .icm_log import audit_logs, find_logs, read_logs
+
+    infos, errors = read_logs(find_logs(args.root), head_tail=not args.full_scan)
+    rows = audit_logs(infos, args.max_vbep, args.max_zone_mass_error, not args.allow_incomplete, root=args.root)
+    write_result(rows, args.output)
+    return _report_errors(errors)
+
+def run_vectors(args):
+    from .vectors import grid_vectors, parse_area, process_shapefile
+
+    area = parse_area(args.area)
+    if args.cell_size:
+        n_points = grid_vectors(args.shapefile, args.output_path, args.cell_size, area)
+    else:
+        n_points = process_shapefile(args.shapefile, args.output_path, area)
+    print(f"{n_points} points written to {args.output_path}.", file=sys.stderr)
+    return 0
+
+def run_rasterize(args):
+    from .rasterize import rasterize_shapefiles
+    from .vectors import parse_area
+
+    raster_types = ["DEPTH2D", "elevation2"] if args.parameter == "Both" else [args.parameter]
+    raster_types += [attribute for attribute in args.attributes if attribute not in raster_types]
+    outputs = rasterize_shapefiles(args.folders, args.output_folder, raster_types, args.cell_size, parse_area(args.area))
+    write_result([{"Raster": path} for path in outputs], args.output)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m maup_tools", description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add(name, handler, help):
+        subparser = subparsers.add_parser(name, help=help, description=help)
+        subparser.set_defaults(handler=handler)
+        return subparser
+
+    def add_output(subparser):
+        subparser.add_argument("-o", "--output", help="CSV or JSON file to write; JSON to stdout if omitted")
+
+    def add_area(subparser):
+        subparser.add_argument("--area", default="",
+                               help="area of interest: 'minx,miny,maxx,maxy' in the model's coordinates, or a polygon file")
+
+    sub = add("mass-balance", run_mass_balance, "Summarise the cumulative mass error of TUFLOW MB.csv files.")
+    sub.add_argument("files", nargs="+")
+    sub.add_argument("--threshold", type=float, default=1.0, help="cumulative mass error threshold (%%)")
+    add_output(sub)
+
+    sub = add("courant", run_courant, "Find the Nu, Nc and Nd exceedance events of TUFLOW HPC.dt.csv files.")
+    sub.add_argument("files", nargs="+")
+    sub.add_argument("--events", help="CSV or JSON file to write every exceedance event to")
+    add_output(sub)
+
+    sub = add("histogram", run_histogram, "Bin a stage difference raster and summarise its statistics.")
+    sub.add_argument("raster")
+    sub.add_argument("--bins", default="-100, -0.1, -0.05, -0.01, 0.01, 0.05, 0.1, 100",
+                     help="bin edges separated by commas")
+    sub.add_argument("--thresholds", default="0.01, 0.05, 0.1",
+                     help="thresholds for the area above, separated by commas")
+    add_output(sub)
+
+    sub = add("volume", run_volume, "Calculate the volume and wet area of a depth raster.")
+    sub.add_argument("raster")
+    sub.add_argument("--zones", help="polygon layer of storage areas to report separately")
+    sub.add_argument("--zone-field", help="attribute that names the storage areas")
+    add_output(sub)
+
+    sub = add("stage-storage", run_stage_storage, "Derive the stage-storage curve of a depth raster.")
+    sub.add_argument("raster")
+    sub.add_argument("--interval", type=float, default=0.1, help="level interval (m)")
+    sub.add_argument("--water-level", type=float, help="water level of the depth raster (mOD)")
+    add_output(sub)
+
+    sub = add("rating-curve", run_rating_curve, "Generate the rating curve of a circular pipe.")
+    sub.add_argument("--diameter", type=float, required=True, help="diameter (m)")
+    sub.add_argument("--slope", type=float, required=True, help="slope (m/m)")
+    sub.add_argument("--manning-n", type=float, default=0.013, help="Manning's roughness coefficient")
+    sub.add_argument("--invert-level", type=float, default=0.0, help="invert level (mOD)")
+    sub.add_argument("--points", type=int, default=100, help="number of points on the curve")
+    add_output(sub)
+
+    sub = add("log", run_log, "Extract the run details and mass balance of InfoWorks ICM SIM.log files.")
+    sub.add_argument("files", nargs="+")
+    sub.add_argument("--full-scan", action="store_true",
+                     help="read the whole of each log rather than its head and its tail")
+    add_output(sub)
+
+    sub = add("log-audit", run_log_audit, "Audit every InfoWorks ICM SIM log under a results folder.")
+    sub.add_argument("root")
+    sub.add_argument("--max-vbep", type=float, default=1.0, help="maximum |VBEP| (%%)")
+    sub.add_argument("--max-zone-mass-error", type=float, help="maximum 2D zone mass error (m3)")
+    sub.add_argument("--allow-incomplete", action="store_true",
+                     help="pass simulations that did not reach the requested duration")
+    sub.add_argument("--full-scan", action="store_true",
+                     help="read the whole of each log rather than its head and its tail")
+    add_output(sub)
+
+    sub = add("vectors", run_vectors, 'Convert an ICM "2D Zones.shp" to velocity vector points.')
+    sub.add_argument("shapefile")
+    sub.add_argument("output_path", help="a .shp, .gpkg, .fgb or .parquet file")
+    sub.add_argument("--cell-size", type=float, help="aggregate the elements onto a grid of this cell size (m)")
+    add_area(sub)
+
+    sub = add("rasterize", run_rasterize, 'Convert the ICM "2D Zones.shp" files under folders to GeoTIFF rasters.')
+    sub.add_argument("folders", nargs="+")
+    sub.add_argument("--output-folder", required=True)
+    sub.add_argument("--parameter", choices=["DEPTH2D", "elevation2", "Both"], default="Both")
+    sub.add_argument("--attributes", nargs="+", default=[], help="other numeric attributes to rasterize in the same pass")
+    sub.add_argument("--cell-size", type=float, default=2.0)
+    add_area(sub)
+    add_output(sub)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
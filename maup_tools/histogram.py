@@ -0,0 +1,114 @@
+import os
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from .parallel import map_in_processes
+from .raster_io import gdal_options, inspect_layout, open_raster, read_band, record_operation
+
+RASTER_EXTENSIONS = (".tif", ".tiff", ".asc")
+
+
+def generate_bin_labels(bin_edges):
+    """Generate bin labels based on bin edges."""
+    bin_labels = []
+    for i in range(len(bin_edges) - 1):
+        if i == 0:
+            bin_labels.append(f'< {bin_edges[i+1]}')
+        elif i == len(bin_edges) - 2:
+            bin_labels.append(f'> {bin_edges[i]}')
+        else:
+            bin_labels.append(f'{bin_edges[i]} to {bin_edges[i+1]}')
+    return bin_labels
+
+def check_bin_edges(bin_edges):
+    """Return the bin edges as a float array, raising ValueError if they are not increasing."""
+    edges = np.asarray(bin_edges, dtype=np.float64)
+    if edges.ndim != 1 or len(edges) < 2:
+        raise ValueError("At least two bin edges are required.")
+    if not np.all(np.diff(edges) > 0):
+        raise ValueError("Bin edges must increase monotonically.")
+    return edges
+
+def bin_block(values, edges):
+    """Count values per bin, with the lowest edge included in the first bin.
+
+    Returns an array of len(edges) + 1 counts: values below the first edge,
+    one count per bin, and values above the last edge.
+    """
+    # side='left' makes every bin closed on the right, like pd.cut
+    idx = np.searchsorted(edges, values, side='left')
+    idx[values == edges[0]] = 1
+    return np.bincount(idx, minlength=len(edges) + 1)
+
+def valid_values(block):
+    """Flatten a masked block to its valid values, dropping NaNs."""
+    values = block.compressed()
+    if values.dtype.kind == 'f':
+        values = values[~np.isnan(values)]
+    return values
+
+def histogram_counts(raster_path, bin_edges):
+    """Count raster cells per bin, reading the raster one internal block at a time.
+
+    Returns the counts per bin and the total number of valid cells, which
+    includes cells falling outside the bin edges.
+    """
+    edges = check_bin_edges(bin_edges)
+    counts = np.zeros(len(edges) + 1, dtype=np.int64)
+
+    with open_raster(raster_path) as src:
+        for _, window in src.block_windows(1):
+            # Masked read hides the nodata cells of this block only
+            values = valid_values(read_band(src, window))
+            if values.size:
+                counts += bin_block(values, edges)
+
+    return counts[1:-1], int(counts.sum())
+
+def find_rasters(folder):
+    """List the rasters directly inside a folder, sorted by name."""
+    return sorted(os.path.join(folder, f) for f in os.listdir(folder)
+                  if f.lower().endswith(RASTER_EXTENSIONS) and os.path.isfile(os.path.join(folder, f)))
+
+def scenario_names(raster_paths):
+    """Name each raster by its file name without extension, or by its path where names clash."""
+    names = [os.path.splitext(os.path.basename(path))[0] for path in raster_paths]
+    if len(set(names)) < len(names):
+        return [os.fspath(path) for path in raster_paths]
+    return names
+
+def _worker_histogram_counts(raster_path, bin_edges, options):
+    """Run histogram_counts in a worker process under the caller's GDAL options, returning the reads it made too."""
+    gdal_options.update(options)
+    with record_operation("histogram_counts", raster_path) as trace:
+        counts = histogram_counts(raster_path, bin_edges)
+    return counts, (trace.reads, trace.bytes_read)
+
+def batch_histogram_percentages(raster_paths, bin_edges, max_workers=None):
+    """Bin many rasters concurrently in a process pool with the same bin edges.
+
+    The workers open the rasters under the GDAL options configured here,
+    and their reads are added up in one trace of the batch. Returns a
+    DataFrame with one row per raster: the scenario name, the number of
+    valid cells and the percentage of cells in each bin.
+    """
+    edges = tuple(check_bin_edges(bin_edges))
+    # Workers are separate processes, so they are given the GDAL options configured here
+    job = partial(_worker_histogram_counts, bin_edges=edges, options=dict(gdal_options))
+    with record_operation("batch histogram", f"{len(raster_paths)} rasters") as trace:
+        results = []
+        for counts, (reads, bytes_read) in map_in_processes(job, raster_paths, max_workers=max_workers,
+                                                             preload=[__name__]):
+            results.append(counts)
+            trace.add_read(bytes_read, reads)
+        if raster_paths:
+            trace.layout = inspect_layout(raster_paths[0])
+
+    rows = []
+    for name, (bin_counts, n_total) in zip(scenario_names(raster_paths), results):
+        percentages = (bin_counts / n_total) * 100 if n_total else np.full(len(bin_counts), np.nan)
+        rows.append({"Scenario": name, "Valid cells": n_total,
+                     **dict(zip(generate_bin_labels(bin_edges), percentages))})
+    return pd.DataFrame(rows)
@@ -0,0 +1,564 @@
+import fnmatch
+import io
+import os
+import re
+from array import array
+from functools import partial
+
+from .parallel import map_in_processes
+
+# Bytes read from the log at a time
+CHUNK_SIZE = 4 * 2**20
+
+# Bytes read from the start of a log for the fields written before the simulation runs
+HEAD_BYTES = 4 * 2**20
+
+# Bytes read backwards from the end of a log, at most, for the fields written when it finishes
+MAX_TAIL_BYTES = 64 * 2**20
+
+# Which of the lines holding a keyword a field is read from
+FIRST, LAST, SECOND, ANY = "first", "last", "second", "any"
+
+# Each field: the keyword its lines contain, the pattern its value is read
+# with, and which line it is read from. A field that is read from the last
+# matching line is overwritten by every later match; the others stop being
+# looked for once they are found.
+LOG_FIELDS = {
+    "version": (b"InfoWorks ICM SIM", re.compile(r'InfoWorks ICM SIM\s*(.*)'), LAST),
+    "volume_balance_error": (b"VBEP -> Volume balance error %",
+                             re.compile(r'VBEP -> Volume balance error %\s*:\s*(-?\d+\.\d+)'), LAST),
+    "elapsed_clock_time": (b"Elapsed clock time", re.compile(r'Elapsed clock time\s*=\s*(\d+s)'), LAST),
+    "gpu_used": (b"GPU used successfully", None, ANY),
+    "network": (b"Network:", re.compile(r'Network:\s*([-\w\s()#]+)'), LAST),
+    "network_scenario": (b"Network Scenario:", re.compile(r'Network Scenario:\s*(\w+)'), LAST),
+    "inflow": (b"Inflow:", re.compile(r'Inflow:\s*.*>\s*([\w\s%]+)'), LAST),
+    "level": (b"Level:", re.compile(r'Level:\s*.*>\s*([^>]+)'), LAST),
+    "rainfall_event": (b"Rainfall event:", re.compile(r'Rainfall event:\s*.*>\s*([^>]+)'), LAST),
+    "event_details": (b"Event details:", re.compile(r'Event details:\s*(.*)'), FIRST),
+    "start_time": (b"Start time -", re.compile(r'Start time\s*-\s*(.*)'), FIRST),
+    "requested_duration": (b"Requested duration (min) -",
+                           re.compile(r'Requested duration \(min\)\s*-\s*(\d+)'), FIRST),
+    # The first minimum element area is before the mesh is cleaned up
+    "min_element_area": (b"Minimum element area (m2)",
+                         re.compile(r'Minimum element area \(m2\)\s*:\s*([\d\.]+)'), SECOND),
+    "max_element_area": (b"Maximum element area (m2)",
+                         re.compile(r'Maximum element area \(m2\)\s*:\s*([\d\.]+)'), LAST),
+    "boundary_condition": (b"External Boundary Condition",
+                           re.compile(r'External Boundary Condition\s*:\s*(.*)'), LAST),
+    "twod_zone_mass_error": (b"2d Zone mass error (m3)",
+                             re.compile(r'2d Zone mass error \(m3\)\s*:\s*([\d\.]+)'), LAST),
+    "timestep_value": (b"Timestep:", re.compile(r'Timestep:\s*([\d\.]+min)'), LAST),
+}
+
+# Fields written when the simulation finishes, which the head and tail reader looks for at the end
+TAIL_FIELDS = ("volume_balance_error", "twod_zone_mass_error", "elapsed_clock_time", "timestep_value")
+
+TIMESTEP_KEYWORD = b"Timestep:"
+
+# Characters read after each timestep keyword for its simulated time
+NUMBER_WIDTH = 24
+
+
+
+
+def _line_at(buffer, pos):
+    """Return the start and end of the line holding buffer[pos]."""
+    start = buffer.rfind(b"\n", 0, pos) + 1
+    end = buffer.find(b"\n", pos)
+    return start, len(buffer) if end < 0 else end
+
+def _match_line(buffer, start, end, pattern):
+    return pattern.search(buffer[start:end].decode("utf-8"))
+
+
+class LogScanner:
+    """Collect the fields of an ICM SIM.log from successive buffers of whole lines.
+
+    Lines are found with bytes.find and bytes.rfind on each field's keyword,
+    which run at memory speed, and only the lines that hold a keyword are
+    decoded and matched. Fields that are read from their last line are
+    searched from the end of each buffer, so the timestep line that is
+    repeated throughout the log costs one search per buffer.
+    """
+
+    def __init__(self, fields=LOG_FIELDS):
+        self.fields = fields
+        self.values = {name: None for name in fields}
+        self.line_counts = {name: 0 for name in fields}
+        self.pending = {name for name, (_, _, which) in fields.items() if which != LAST}
+
+    def missing(self):
+        """Names of the fields not found yet."""
+        return [name for name, (_, _, which) in self.fields.items()
+                if (self.values[name] is None if which == LAST else name in self.pending)]
+
+    def update(self, buffer):
+        for name, (keyword, pattern, which) in self.fields.items():
+            if which == LAST:
+                self._scan_last(buffer, name, keyword, pattern)
+            elif name in self.pending:
+                self._scan_first(buffer, name, keyword, pattern, which)
+
+    def _scan_last(self, buffer, name, keyword, pattern):
+        pos = buffer.rfind(keyword)
+        while pos >= 0:
+            start, end = _line_at(buffer, pos)
+            match = _match_line(buffer, start, end, pattern)
+            if match:
+                self.values[name] = match.group(1)
+                return
+            pos = buffer.rfind(keyword, 0, start)
+
+    def _scan_first(self, buffer, name, keyword, pattern, which):
+        pos = buffer.find(keyword)
+        while pos >= 0:
+            start, end = _line_at(buffer, pos)
+            if which == ANY:
+                self.values[name] = True
+                self.pending.discard(name)
+                return
+            self.line_counts[name] += 1
+            if which == SECOND:
+                if self.line_counts[name] == 2:
+                    match = _match_line(buffer, start, end, pattern)
+                    self.values[name] = match.group(1) if match else None
+                    self.pending.discard(name)
+                    return
+            else:
+                match = _match_line(buffer, start, end, pattern)
+                if match:
+                    self.values[name] = match.group(1)
+                    self.pending.discard(name)
+                    return
+            pos = buffer.find(keyword, end)
+
+
+def find_keyword(data, keyword):
+    """Positions of every occurrence of keyword in a uint8 array, found with array comparisons."""
+    import numpy as np
+
+    positions = np.flatnonzero(data[:max(0, len(data) - len(keyword) + 1)] == keyword[0])
+    for i, byte in enumerate(keyword[1:], 1):
+        positions = positions[data[positions + i] == byte]
+    return positions
+
+def read_minutes(data, starts, width=NUMBER_WIDTH):
+    """Parse the number of minutes written at each start of a uint8 array, such as '12.50min'.
+
+    Spaces and tabs before the number are skipped. The numbers are read one
+    character at a time for all the records at once: the digits are gathered
+    into an integer and divided once by a power of ten, which rounds exactly
+    as float() does. Returns NaN where there is no number followed by 'min'.
+    """
+    import numpy as np
+
+    padded = np.concatenate([data, np.zeros(width + 3, dtype=np.uint8)])
+    pos = np.asarray(starts, dtype=np.int64).copy()
+    for _ in range(width):
+        blank = (padded[pos] == ord(" ")) | (padded[pos] == ord("\t"))
+        if not blank.any():
+            break
+        pos += blank
+
+    mantissa = np.zeros(len(pos), dtype=np.int64)
+    n_digits = np.zeros(len(pos), dtype=np.int64)
+    n_dots = np.zeros(len(pos), dtype=np.int64)
+    decimals = np.zeros(len(pos), dtype=np.int64)
+    active = np.ones(len(pos), dtype=bool)
+    for _ in range(width):
+        char = padded[pos]
+        digit = active & (char >= ord("0")) & (char <= ord("9"))
+        dot = active & (char == ord("."))
+        active = digit | dot
+        if not active.any():
+            break
+        # Up to 15 digits are always exact in a float64, and more are rejected below
+        mantissa = np.where(digit & (n_digits < 15), mantissa * 10 + (char - ord("0")), mantissa)
+        decimals += digit & (n_dots > 0)
+        n_digits += digit
+        n_dots += dot
+        pos += active
+
+    unit = (padded[pos] == ord("m")) & (padded[pos + 1] == ord("i")) & (padded[pos + 2] == ord("n"))
+    valid = unit & (n_digits >= 1) & (n_digits <= 15) & (n_dots <= 1)
+    return np.where(valid, mantissa / 10.0 ** np.minimum(decimals, 15), np.nan)
+
+def read_clock(data, starts, ends):
+    """Parse the first wall clock time of day, such as '9:05:30' or '23:59:59', between each start and end of a uint8 array.
+
+    Times of day are found from their second colon with array comparisons
+    over the whole array, so every record is checked on its own line, and
+    must stand as a whole word, as the regular expression
+    r'\b\d{1,2}:\d{2}:\d{2}\b' would find them. Returns the seconds since
+    midnight, or NaN where there is no time between start and end.
+    """
+    import numpy as np
+
+    def is_digit(chars):
+        return (chars >= ord("0")) & (chars <= ord("9"))
+
+    def is_word(chars):
+        lower = chars | 0x20
+        return is_digit(chars) | ((lower >= ord("a")) & (lower <= ord("z"))) | (chars == ord("_"))
+
+    clock = np.full(len(starts), np.nan)
+    # Padded so that every character looked at around a colon exists; the padding is not a word character
+    padded = np.concatenate([np.zeros(3, dtype=np.uint8), data, np.zeros(4, dtype=np.uint8)])
+    colons = np.flatnonzero(data == ord(":")) + 3
+    two_digit_hours = is_digit(padded[colons - 2])
+    found = (is_digit(padded[colons - 1]) & is_digit(padded[colons + 1]) & is_digit(padded[colons + 2])
+             & (padded[colons + 3] == ord(":")) & is_digit(padded[colons + 4]) & is_digit(padded[colons + 5])
+             & ~is_word(padded[colons + 6])
+             & ~is_word(np.where(two_digit_hours, padded[colons - 3], padded[colons - 2])))
+    colons, two_digit_hours = colons[found], two_digit_hours[found]
+    if not len(colons):
+        return clock
+
+    def digit(offset):
+        return padded[colons + offset].astype(np.float64) - ord("0")
+
+    hours = digit(-1) + np.where(two_digit_hours, 10 * digit(-2), 0)
+    seconds = hours * 3600 + (10 * digit(1) + digit(2)) * 60 + 10 * digit(4) + digit(5)
+    # Each time belongs to the record whose span holds it; the first one of a record is kept
+    time_starts = colons - 3 - 1 - two_digit_hours
+    record = np.searchsorted(starts, time_starts, side="right") - 1
+    inside = record >= 0
+    inside[inside] = time_starts[inside] < np.asarray(ends)[record[inside]]
+    records, first = np.unique(record[inside], return_index=True)
+    clock[records] = seconds[inside][first]
+    return clock
+
+class TimestepTrace:
+    """Every timestep record of an ICM SIM.log, collected from successive buffers of whole lines.
+
+    Each record keeps its simulated time (min), the byte offset of its line
+    in the log, and the wall clock time of day (s) where the line has one,
+    in typed arrays that grow in place. The keyword is found and the times
+    are parsed with array operations over the whole buffer.
+    """
+
+    def __init__(self):
+        self.minutes = array("d")
+        self.offsets = array("q")
+        self.clock = array("d")
+
+    def __len__(self):
+        return len(self.minutes)
+
+    def update(self, buffer, offset=0):
+        import numpy as np
+
+        data = np.frombuffer(buffer, dtype=np.uint8)
+        positions = find_keyword(data, TIMESTEP_KEYWORD)
+        if not len(positions):
+            return
+        minutes = read_minutes(data, positions + len(TIMESTEP_KEYWORD))
+        # Each record's line starts one past the newline before it and ends at the newline after it
+        newlines = np.flatnonzero(data == ord("\n"))
+        following = np.searchsorted(newlines, positions)
+        line_starts = np.append(-1, newlines)[following] + 1
+        line_ends = np.append(newlines, len(data))[following]
+        # The wall clock time is looked for after the keyword, on the record's own line
+        clock = read_clock(data, positions + len(TIMESTEP_KEYWORD), line_ends)
+
+        self.minutes.frombytes(minutes.tobytes())
+        self.offsets.frombytes((line_starts + offset).astype(np.int64).tobytes())
+        self.clock.frombytes(clock.tobytes())
+
+    def arrays(self):
+        """The records as NumPy arrays sharing the memory of the trace."""
+        import numpy as np
+
+        return (np.frombuffer(self.minutes, dtype=np.float64), np.frombuffer(self.offsets, dtype=np.int64),
+                np.frombuffer(self.clock, dtype=np.float64))
+
+    @property
+    def has_clock(self):
+        import numpy as np
+
+        return bool(len(self.clock)) and not np.isnan(np.frombuffer(self.clock, dtype=np.float64)).all()
+
+    @property
+    def elapsed(self):
+        """Wall clock seconds since the first record with a clock time, carried over midnight.
+
+        Records without a clock time are NaN, and the time between the records
+        either side of them is still counted.
+        """
+        import numpy as np
+
+        _, _, clock = self.arrays()
+        timed = ~np.isnan(clock)
+        steps = np.diff(clock[timed], prepend=clock[timed][:1])
+        steps[steps < 0] += 86400
+        elapsed = np.full(len(clock), np.nan)
+        elapsed[timed] = np.cumsum(steps)
+        return elapsed
+
+    @property
+    def steps(self):
+        """The timestep of every record (min), from the simulated time of the record before it."""
+        import numpy as np
+
+        minutes, _, _ = self.arrays()
+        return np.diff(minutes, prepend=np.nan)
+
+
+def scan_log(stream, chunk_size=CHUNK_SIZE, scanner=None, trace=None):
+    """Read a SIM.log byte stream once, in chunks of whole lines, and return the raw field values.
+
+    If a TimestepTrace is given, every timestep record is added to it in the
+    same pass.
+    """
+    scanner = scanner or LogScanner()
+    remainder = b""
+    offset = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        chunk = remainder + chunk
+        # Carry a partial last line over to the next chunk
+        end = chunk.rfind(b"\n") + 1
+        if end:
+            scanner.update(chunk[:end])
+            if trace is not None:
+                trace.update(chunk[:end], offset)
+        remainder = chunk[end:]
+        offset += end
+    if remainder:
+        scanner.update(remainder)
+        if trace is not None:
+            trace.update(remainder, offset)
+    return scanner.values
+
+def _scan_tail(f, size, stop, fields, chunk_size=CHUNK_SIZE):
+    """Search backwards from the end of a file, down to byte stop, for the last line of each field.
+
+    Reading stops once every field is found or MAX_TAIL_BYTES have been
+    read. Returns the values found, and whether the search reached stop.
+    """
+    found = {}
+    pos, carry = size, b""
+    while pos > stop and len(found) < len(fields) and size - pos < MAX_TAIL_BYTES:
+        start = max(stop, pos - chunk_size)
+        f.seek(start)
+        data = f.read(pos - start) + carry
+        pos = start
+        if start > stop:
+            # Carry the first line over to the next read, as it may begin before this chunk
+            cut = data.find(b"\n") + 1
+            if not cut:
+                carry = data
+                continue
+            carry, data = data[:cut], data[cut:]
+        else:
+            carry = b""
+        scanner = LogScanner({name: LOG_FIELDS[name] for name in fields if name not in found})
+        scanner.update(data)
+        # Chunks are read from the end, so the first value found is the last in the file
+        found.update((name, value) for name, value in scanner.values.items() if value is not None)
+    return found, pos <= stop and not carry
+
+def scan_log_head_tail(f, head_bytes=HEAD_BYTES, fallback=False, chunk_size=CHUNK_SIZE):
+    """Read the fields of a seekable SIM.log from its head and its tail, without reading the middle.
+
+    Every field is looked for in the first head_bytes, and the fields
+    written when the simulation finishes are read backwards from the end of
+    the file, so they have their values from the last line as in a full
+    scan. Fields read from their last line that are found in the head keep
+    the value from the head, and the other fields missing from the head are
+    taken to be absent, as many logs never write them. The backward search
+    gives up after MAX_TAIL_BYTES; if fallback is true, the rest of the file
+    is then scanned for the end-of-run fields it did not find.
+    """
+    size = f.seek(0, os.SEEK_END)
+    f.seek(0)
+    head = f.read(head_bytes)
+    head_end = len(head) if len(head) == size else head.rfind(b"\n") + 1
+    scanner = LogScanner()
+    scanner.update(head[:head_end])
+    values = dict(scanner.values)
+    if head_end == size:
+        return values
+
+    found, complete = _scan_tail(f, size, head_end, TAIL_FIELDS, chunk_size)
+    values.update(found)
+    missing = [name for name in TAIL_FIELDS if name not in found] if not complete else []
+    if fallback and missing:
+        # Carry on from the head, only for the end-of-run fields the tail did not reach
+        scanner.fields = {name: LOG_FIELDS[name] for name in missing}
+        f.seek(head_end)
+        values.update((name, value) for name, value in scan_log(f, chunk_size, scanner).items() if name in missing)
+    return values
+
+def read_log_info(source, head_tail=False, fallback=False):
+    """Extract the log information from a SIM.log path or binary file object, streaming it in chunks.
+
+    With head_tail, only the head and the tail of the log are read, as in
+    scan_log_head_tail.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return read_log_info(f, head_tail, fallback)
+    if head_tail:
+        return _log_info(scan_log_head_tail(source, fallback=fallback))
+    return _log_info(scan_log(source))
+
+def read_log_trace(source):
+    """Extract the log information and the TimestepTrace of a SIM.log path or binary file object in one full pass."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return read_log_trace(f)
+    trace = TimestepTrace()
+    return _log_info(scan_log(source, trace=trace)), trace
+
+def progress_rates(trace, bins=200):
+    """Split the simulated time of a trace into equal bins and measure how slowly each one ran.
+
+    The rate is the wall clock seconds per simulated minute where at least two
+    records have both a simulated time and a clock time, and otherwise the
+    number of timesteps per simulated minute.
+    Returns the bin edges (min), the rate of each bin and its unit.
+    """
+    import numpy as np
+
+    minutes, _, _ = trace.arrays()
+    valid = ~np.isnan(minutes)
+    minutes = minutes[valid]
+    if len(minutes) < 2 or minutes[-1] <= minutes[0]:
+        return np.zeros(0), np.zeros(0), None
+    edges = np.linspace(minutes[0], minutes[-1], bins + 1)
+    bin_minutes = np.diff(edges)
+    if trace.has_clock:
+        # Wall clock time at each edge, interpolated between the records
+        elapsed = trace.elapsed[valid]
+        timed = ~np.isnan(elapsed)
+        # Without two timed records there is nothing to interpolate between, so the timesteps are counted instead
+        if np.count_nonzero(timed) >= 2:
+            seconds = np.diff(np.interp(edges, minutes[timed], elapsed[timed]))
+            return edges, seconds / bin_minutes, "s per simulated min"
+    counts = np.histogram(minutes[1:], bins=edges)[0]
+    return edges, counts / bin_minutes, "timesteps per simulated min"
+
+def slow_periods(trace, bins=200, factor=2.0):
+    """List the periods of simulated time that ran at least factor times slower than the median rate."""
+    import numpy as np
+    from .series import exceedance_runs
+
+    edges, rates, unit = progress_rates(trace, bins)
+    if not len(rates):
+        return []
+    median = float(np.median(rates))
+    starts, stops, peaks = exceedance_runs(rates, factor * median) if median > 0 else ([], [], [])
+    return [{
+        "Start (min)": edges[start],
+        "End (min)": edges[stop],
+        f"Peak rate ({unit})": peak,
+        "Times the median rate": peak / median,
+    } for start, stop, peak in zip(starts, stops, peaks)]
+
+def extract_log_info(file_content):
+    """Extract the run details, boundary conditions and mass balance of an InfoWorks ICM SIM.log."""
+    if isinstance(file_content, str):
+        file_content = file_content.encode("utf-8")
+    return _log_info(scan_log(io.BytesIO(file_content)))
+
+def _strip(value):
+    return value.strip() if value is not None else None
+
+def _log_info(values):
+    return {
+        "InfoWorks ICM version": values["version"],
+        "Network": values["network"],
+        "Scenario": values["network_scenario"],
+        "Inflow": values["inflow"],
+        "Level": _strip(values["level"]),
+        "Rainfall event": _strip(values["rainfall_event"]),
+        "Event details": values["event_details"],
+        "Minimum Element Area (m2)": values["min_element_area"],
+        "Maximum Element Area (m2)": values["max_element_area"],
+        "External Boundary Condition": _strip(values["boundary_condition"]),
+        "Start time": values["start_time"],
+        "Requested duration (min)": values["requested_duration"],
+        "VBEP": values["volume_balance_error"],
+        "2D Zone Mass Error (m3)": values["twod_zone_mass_error"],
+        "Elapsed clock time": values["elapsed_clock_time"],
+        "GPU used": "Yes" if values["gpu_used"] else "No",
+        "Finish time": values["timestep_value"]
+    }
+
+def find_logs(root):
+    """List every SIM log under a results folder tree, sorted by path."""
+    logs = []
+    for folder, _, files in os.walk(root):
+        logs.extend(os.path.join(folder, f) for f in files if fnmatch.fnmatch(f.lower(), "*sim*.log"))
+    return sorted(logs)
+
+def _read_log_or_error(path, head_tail=True):
+    try:
+        return read_log_info(path, head_tail), None
+    except (OSError, UnicodeDecodeError) as e:
+        return None, str(e)
+
+def read_logs(paths, max_workers=None, head_tail=True):
+    """Parse many SIM logs in a process pool, reading only their head and tail unless head_tail is false.
+
+    Returns the log information and the error message of each unreadable
+    log, both keyed by path.
+    """
+    infos, errors = {}, {}
+    results = map_in_processes(partial(_read_log_or_error, head_tail=head_tail), paths,
+                               max_workers=max_workers, preload=[__name__])
+    for path, (info, error) in zip(paths, results):
+        if error is not None:
+            errors[path] = error
+        else:
+            infos[path] = info
+    return infos, errors
+
+def _number(value, suffix=""):
+    """Convert an extracted value such as '1234s' or '60.0min' to a float, or None if it is missing."""
+    if value is None:
+        return None
+    try:
+        return float(value[:len(value) - len(suffix)] if suffix and value.endswith(suffix) else value)
+    except ValueError:
+        return None
+
+def audit_log(info, max_vbep=1.0, max_zone_mass_error=None, require_completion=True):
+    """Check the mass balance and completion of one simulation, returning its row of the audit table."""
+    vbep = _number(info["VBEP"])
+    zone_mass_error = _number(info["2D Zone Mass Error (m3)"])
+    finish_time = _number(info["Finish time"], "min")
+    requested_duration = _number(info["Requested duration (min)"])
+
+    issues = []
+    if vbep is None:
+        issues.append("no VBEP")
+    elif abs(vbep) > max_vbep:
+        issues.append(f"|VBEP| above {max_vbep}%")
+    if max_zone_mass_error is not None and zone_mass_error is not None and zone_mass_error > max_zone_mass_error:
+        issues.append(f"2D zone mass error above {max_zone_mass_error} m3")
+    if require_completion and (finish_time is None or requested_duration is None or finish_time < requested_duration):
+        issues.append("did not reach the requested duration")
+
+    return {
+        "Version": info["InfoWorks ICM version"],
+        "Network": info["Network"],
+        "Scenario": info["Scenario"],
+        "VBEP (%)": vbep,
+        "2D zone mass error (m3)": zone_mass_error,
+        "Elapsed time (s)": _number(info["Elapsed clock time"], "s"),
+        "GPU used": info["GPU used"],
+        "Finish time (min)": finish_time,
+        "Requested duration (min)": requested_duration,
+        "Pass": not issues,
+        "Issues": "; ".join(issues),
+    }
+
+def audit_logs(infos, max_vbep=1.0, max_zone_mass_error=None, require_completion=True, root=None):
+    """Build the audit table of many simulations, one row per log, named relative to the root folder if given."""
+    return [{"File": os.path.relpath(path, root) if root else path,
+             **audit_log(info, max_vbep, max_zone_mass_error, require_completion)}
+            for path, info in infos.items()]
@@ -0,0 +1,47 @@
+import multiprocessing
+import os
+import sys
+import types
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+
+@contextmanager
+def _detached_main():
+    """Hide the calling script from multiprocessing while worker processes start.
+
+    Streamlit runs each page as __main__, and new workers would otherwise
+    import the page again and run all of it.
+    """
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+def process_pool(max_workers, preload=()):
+    """Create a process pool, forking workers from a clean fork server where available."""
+    max_workers = max(1, max_workers or os.cpu_count() or 1)
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(list(preload))
+    else:
+        context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+
+def map_in_processes(function, items, max_workers=None, preload=()):
+    """Call a module-level function on every item in a process pool, returning the results in order.
+
+    preload names the modules the workers need, so they are imported once by
+    the fork server rather than by every worker.
+    """
+    items = list(items)
+    if not items:
+        return []
+    n_workers = min(max_workers or os.cpu_count() or 1, len(items))
+    with process_pool(n_workers, preload) as executor:
+        # Workers start as tasks are submitted, so every submit happens with the page hidden
+        with _detached_main():
+            futures = [executor.submit(function, item) for item in items]
+        return [future.result() for future in futures]
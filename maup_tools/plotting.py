@@ -0,0 +1,91 @@
+import hashlib
+import io
+import os
+
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+from .cache import ResultCache
+
+# Points sent to the renderer per series, whatever the file length
+MAX_PLOT_POINTS = 4000
+
+# Rendered charts shared by every session, keyed by the plotted data and the plot options
+rendered = ResultCache(max_bytes=int(os.environ.get("MAUP_CHART_CACHE_MB", 64)) * 2**20)
+
+
+def minmax_indices(y, max_points=MAX_PLOT_POINTS):
+    """Indices of the points to plot so that a series keeps its shape within max_points.
+
+    The series is split into max_points // 4 equal buckets, roughly one per
+    pixel column, and the first, last, minimum and maximum of every bucket
+    are kept. Every spike therefore survives, however short.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+
+    bucket = -(-n // max(1, max_points // 4))
+    n_buckets = -(-n // bucket)
+    padded = n_buckets * bucket
+    starts = np.arange(n_buckets) * bucket
+
+    # Pad the last bucket, and keep NaNs from being picked as a minimum or maximum
+    low = np.full(padded, np.inf)
+    low[:n] = np.where(np.isnan(y), np.inf, y)
+    high = np.full(padded, -np.inf)
+    high[:n] = np.where(np.isnan(y), -np.inf, y)
+    argmin = starts + low.reshape(n_buckets, bucket).argmin(axis=1)
+    argmax = starts + high.reshape(n_buckets, bucket).argmax(axis=1)
+    last = np.minimum(starts + bucket, n) - 1
+
+    return np.unique(np.concatenate([starts, argmin, argmax, last]))
+
+def downsample(x, y, max_points=MAX_PLOT_POINTS):
+    """Downsample one series for plotting, keeping its minima and maxima."""
+    x = np.asarray(x)
+    y = np.asarray(y)
+    indices = minmax_indices(y, max_points)
+    return x[indices], y[indices]
+
+def data_fingerprint(*data):
+    """Hash arrays, Series, DataFrames and plain values by their contents."""
+    digest = hashlib.blake2b(digest_size=16)
+    for item in data:
+        if isinstance(item, (pd.DataFrame, pd.Series)):
+            digest.update(repr(item.columns.tolist() if isinstance(item, pd.DataFrame) else item.name).encode())
+            digest.update(pd.util.hash_pandas_object(item, index=False).to_numpy())
+        elif isinstance(item, np.ndarray) and item.dtype != object:
+            digest.update(f"{item.dtype}{item.shape}".encode())
+            digest.update(np.ascontiguousarray(np.ma.getdata(item)))
+            if np.ma.is_masked(item):
+                digest.update(np.ascontiguousarray(np.ma.getmaskarray(item)))
+        else:
+            digest.update(repr(item).encode())
+    return digest.hexdigest()
+
+def render_figure(draw, *data, fmt="png", cached=True, **options):
+    """Render draw(fig, *data, **options) to PNG or SVG bytes, cached by a fingerprint of the data and the options.
+
+    The figure is built with the object-oriented API, outside pyplot's
+    global figure registry, and cleared as soon as it is saved, so no
+    figure outlives the call however many reruns and sessions plot. Data
+    that changes on every call, such as a file being followed, is rendered
+    with cached=False, which skips both the fingerprint and the cache.
+    """
+    def compute():
+        fig = Figure()
+        try:
+            draw(fig, *data, **options)
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format=fmt, bbox_inches="tight")
+            return buffer.getvalue()
+        finally:
+            fig.clear()
+
+    if not cached:
+        return compute()
+    key = (draw.__module__, draw.__qualname__, data_fingerprint(*data), fmt, repr(sorted(options.items())))
+    return rendered.get_or_compute(key, compute)
@@ -0,0 +1,47 @@
+import math
+
+import matplotlib
+import numpy as np
+from matplotlib.colors import BoundaryNorm
+from rasterio.enums import Resampling
+
+from .raster_io import open_raster, read_band
+
+# Largest number of cells read and drawn for a quicklook, whatever the raster size
+QUICKLOOK_PIXELS = 1024 * 1024
+
+
+def read_quicklook(raster_path, max_pixels=QUICKLOOK_PIXELS):
+    """Read a decimated copy of band 1 within a pixel budget.
+
+    GDAL serves the read from the closest overview when the raster has
+    overviews, and otherwise resamples the full resolution band to out_shape.
+    Returns the masked array, the raster bounds and whether overviews exist.
+    """
+    with open_raster(raster_path) as src:
+        factor = max(1, math.ceil(math.sqrt(src.width * src.height / max_pixels)))
+        out_shape = (max(1, src.height // factor), max(1, src.width // factor))
+        data = read_band(src, out_shape=out_shape, resampling=Resampling.nearest)
+        has_overviews = bool(src.overviews(1))
+        bounds = tuple(src.bounds)
+    if data.dtype.kind == 'f':
+        data = np.ma.masked_invalid(data)
+    return data, bounds, has_overviews
+
+def draw_quicklook(fig, data, bounds, bin_edges=None, cmap='RdBu_r', label=None):
+    """Draw a quicklook map, coloured by the histogram bin edges when they are given."""
+    left, bottom, right, top = bounds
+    aspect = data.shape[0] / max(data.shape[1], 1)
+    fig.set_size_inches(8, min(12, max(3, 8 * aspect)))
+    ax = fig.subplots()
+    if bin_edges is not None:
+        # One colour per histogram bin
+        norm = BoundaryNorm(bin_edges, ncolors=len(bin_edges) - 1)
+        image = ax.imshow(data, extent=(left, right, bottom, top), cmap=matplotlib.colormaps[cmap].resampled(len(bin_edges) - 1),
+                          norm=norm, interpolation='nearest')
+        fig.colorbar(image, ax=ax, spacing='uniform', ticks=bin_edges, label=label, shrink=0.8)
+    else:
+        image = ax.imshow(data, extent=(left, right, bottom, top), cmap=cmap, interpolation='nearest')
+        fig.colorbar(image, ax=ax, label=label, shrink=0.8)
+    ax.set_aspect('equal')
+    ax.tick_params(axis='x', labelrotation=90)
@@ -0,0 +1,194 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import rasterio
+from rasterio.io import MemoryFile
+
+from .cache import ResultCache, file_identity, layer_identity, source_digest
+
+# Derived raster results (histogram counts, volumes) shared by every session
+results = ResultCache(max_bytes=int(os.environ.get("MAUP_RESULT_CACHE_MB", 256)) * 2**20)
+
+# GDAL configuration every raster is opened under; pages may change it at runtime
+gdal_options = {
+    "GDAL_CACHEMAX": int(os.environ.get("MAUP_GDAL_CACHEMAX_MB", 512)),
+    "GDAL_NUM_THREADS": os.environ.get("MAUP_GDAL_NUM_THREADS", "ALL_CPUS"),
+    "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+}
+
+# Windowed reads from blocks larger than this many cells decode far more than they return
+LARGE_BLOCK_CELLS = 4 * 1024 * 1024
+
+# Rasters larger than this many cells are slow to read from strips or text
+SLOW_LAYOUT_CELLS = 1024 * 1024
+
+# Rasters larger than this many cells are slow to quicklook without overviews
+OVERVIEW_CELLS = 4096 * 4096
+
+# The most recent raster operations, newest last
+io_log = deque(maxlen=50)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class RasterTrace:
+    """Timing, reads and block layout recorded for one raster operation."""
+
+    def __init__(self, operation, raster):
+        self.operation = operation
+        self.raster = raster
+        self.seconds = None
+        self.reads = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.layout = None
+        self.warnings = []
+        self._lock = threading.Lock()
+
+    def add_read(self, nbytes, reads=1):
+        with self._lock:
+            self.reads += reads
+            self.bytes_read += nbytes
+
+    def as_row(self):
+        layout = self.layout or {}
+        return {
+            "Operation": self.operation,
+            "Raster": self.raster,
+            "Time (s)": round(self.seconds, 3) if self.seconds is not None else None,
+            "Reads": self.reads,
+            "Read (MB)": round(self.bytes_read / 2**20, 1),
+            "Written (MB)": round(self.bytes_written / 2**20, 1),
+            "Driver": layout.get("driver"),
+            "Size": layout.get("size"),
+            "Block": layout.get("block"),
+            "Compression": layout.get("compression"),
+            "Overviews": layout.get("overviews"),
+        }
+
+
+@contextmanager
+def open_source(source):
+    """Yield a path that rasterio can open for an uploaded file or a server-side path.
+
+    Uploads are served from memory through GDAL's /vsimem/, so nothing is
+    written to disk and concurrent sessions cannot overwrite each other.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        yield os.fspath(source)
+        return
+    ext = os.path.splitext(source.name)[1] or ".tif"
+    # getvalue() hands back the upload's own bytes, which MemoryFile maps without copying;
+    # getbuffer() would copy them twice, once to unshare the buffer and again in MemoryFile
+    with MemoryFile(source.getvalue(), ext=ext) as memfile:
+        yield memfile.name
+
+def cached_raster_result(source, compute, *args, extra_key=()):
+    """Return compute(raster_path, *args) for a raster source, cached by the hash of its contents.
+
+    extra_key identifies any other input files the result depends on.
+    """
+    key = (source_digest(source), compute.__module__, compute.__qualname__, args, extra_key)
+
+    def compute_from_source():
+        name = source if isinstance(source, (str, os.PathLike)) else source.name
+        with record_operation(compute.__name__, name), open_source(source) as raster_path:
+            return compute(raster_path, *args)
+
+    return results.get_or_compute(key, compute_from_source)
+
+def run_in_threads(raster_path, worker, tasks, max_workers=None):
+    """Deal tasks out to a thread pool as worker(raster_path, tasks) calls and chain their results.
+
+    Each worker opens its own dataset handle; GDAL releases the GIL while reading.
+    """
+    if not tasks:
+        return []
+    n_workers = max(1, min(max_workers or os.cpu_count() or 1, len(tasks)))
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        # Each worker runs in a copy of the caller's context, so its reads reach the caller's trace
+        futures = [executor.submit(contextvars.copy_context().run, worker, raster_path, tasks[i::n_workers])
+                   for i in range(n_workers)]
+        return [result for future in futures for result in future.result()]
+
+def describe_layout(src):
+    """Describe how a dataset is organised on disk."""
+    block_h, block_w = src.block_shapes[0]
+    return {
+        "driver": src.driver,
+        "size": f"{src.width} x {src.height}",
+        "dtype": src.dtypes[0],
+        "block": f"{block_w} x {block_h}",
+        "tiled": block_w < src.width and block_h > 1,
+        "compression": src.compression.value if src.compression else None,
+        "overviews": len(src.overviews(1)),
+        "width": src.width,
+        "height": src.height,
+        "block_width": block_w,
+        "block_height": block_h,
+    }
+
+def layout_warnings(layout):
+    """Explain the block layouts that will make windowed reads slow."""
+    warnings = []
+    cells = layout["width"] * layout["height"]
+    block_cells = layout["block_width"] * layout["block_height"]
+    if layout["driver"] == "AAIGrid" and cells > SLOW_LAYOUT_CELLS:
+        warnings.append("ASCII grids are text and must be parsed line by line; "
+                        "convert to a tiled GeoTIFF (gdal_translate -co TILED=YES) for faster reads.")
+    elif not layout["tiled"] and cells > SLOW_LAYOUT_CELLS:
+        warnings.append(f"The raster is organised in strips of {layout['block']} cells, so every window reads whole rows; "
+                        "convert to a tiled GeoTIFF (gdal_translate -co TILED=YES) for faster windowed reads.")
+    if block_cells > LARGE_BLOCK_CELLS:
+        warnings.append(f"Blocks of {layout['block']} cells are large; each small read decodes a whole block.")
+    if not layout["overviews"] and cells > OVERVIEW_CELLS:
+        warnings.append("The raster has no overviews, so quicklooks resample the full resolution data "
+                        "(gdaladdo can build them).")
+    return warnings
+
+@contextmanager
+def record_operation(operation, raster):
+    """Time a raster operation and collect the reads made by open_raster and read_band inside it."""
+    trace = RasterTrace(operation, os.fspath(raster) if isinstance(raster, (str, os.PathLike)) else raster)
+    token = _current_trace.set(trace)
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        trace.seconds = time.perf_counter() - start
+        _current_trace.reset(token)
+        io_log.append(trace)
+
+def inspect_layout(raster_path):
+    """Open a raster to describe its layout, without reading any cells."""
+    with open_raster(raster_path) as src:
+        return describe_layout(src)
+
+@contextmanager
+def gdal_env():
+    """Enter a rasterio environment with the configured GDAL options."""
+    with rasterio.Env(**gdal_options) as env:
+        yield env
+
+@contextmanager
+def open_raster(raster_path):
+    """Open a raster under the configured GDAL options, noting its layout in the current trace."""
+    with gdal_env(), rasterio.open(raster_path) as src:
+        trace = _current_trace.get()
+        if trace is not None and trace.layout is None:
+            trace.layout = describe_layout(src)
+            trace.warnings = layout_warnings(trace.layout)
+        yield src
+
+def read_band(src, window=None, **kwargs):
+    """Read band 1 as a masked array, counting the bytes in the current trace."""
+    data = src.read(1, window=window, masked=True, **kwargs)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_read(data.data.nbytes)
+    return data
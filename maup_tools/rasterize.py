@@ -0,0 +1,192 @@
+import math
+import os
+from contextlib import ExitStack
+from functools import partial
+
+import numpy as np
+
+from .parallel import map_in_processes
+from .raster_io import gdal_options, inspect_layout, record_operation
+from .vectors import area_bounds, geometry_column, read_area, spatial_filter
+
+NODATA = -9999
+
+# Cells rasterized at a time; the feature index of a strip this size and one band per attribute are in memory
+STRIP_CELLS = 4 * 2**20
+
+# Cell centres tested against the features at a time
+CANDIDATE_CELLS = 4 * 2**20
+
+# Tile size of the rasters written
+BLOCK_SIZE = 256
+
+# Output file name suffixes of the attributes that have one
+RASTER_SUFFIXES = {"DEPTH2D": "d", "elevation2": "h"}
+
+
+def raster_name(folder_name, attribute):
+    """Name the raster of one attribute after the folder holding its "2D Zones.shp"."""
+    return f"{folder_name}_{RASTER_SUFFIXES.get(attribute, attribute)}_Max.tif"
+
+def find_zone_shapefiles(input_folders):
+    """List every "2D Zones.shp" under the input folders."""
+    paths = []
+    for folder in input_folders:
+        for root, dirs, files in os.walk(folder):
+            paths.extend(os.path.join(root, file) for file in files if file == '2D Zones.shp')
+    return paths
+
+def numeric_fields(shapefile_path):
+    """List the numeric attributes of a shapefile, which are the ones that can be rasterized."""
+    import pyogrio
+
+    info = pyogrio.read_info(shapefile_path)
+    return [name for name, dtype in zip(info["fields"], info["dtypes"]) if np.dtype(dtype).kind in "iuf"]
+
+def aligned_extent(layer_bounds, bounds, cell_size):
+    """Clip the extent of a layer to bounds, on the cell grid the whole layer is rasterized on.
+
+    The grid is anchored at the top left corner of the layer, so the
+    clipped extent is widened outwards to whole cells from there, and cells
+    line up with rasters of the whole domain. Returns None if the bounds
+    miss the layer.
+    """
+    left, bottom, right, top = layer_bounds
+    minx, miny = max(left, bounds[0]), max(bottom, bounds[1])
+    maxx, maxy = min(right, bounds[2]), min(top, bounds[3])
+    if minx >= maxx or miny >= maxy:
+        return None
+    return (left + math.floor((minx - left) / cell_size) * cell_size,
+            top - math.ceil((top - miny) / cell_size) * cell_size,
+            left + math.ceil((maxx - left) / cell_size) * cell_size,
+            top - math.floor((top - maxy) / cell_size) * cell_size)
+
+def extent_grid(bounds, cell_size):
+    """The transform, width and height of the grid of cell_size cells over an extent, sized as gdal_rasterize -tr does."""
+    from rasterio.transform import from_origin
+
+    left, bottom, right, top = bounds
+    width = max(1, int((right - left) / cell_size + 0.5))
+    height = max(1, int((top - bottom) / cell_size + 0.5))
+    return from_origin(left, top, cell_size, cell_size), width, height
+
+def burn_index(geometries, geometry_bounds, transform, window, max_candidates=CANDIDATE_CELLS):
+    """Burn the position + 1 of the last feature holding each cell centre of a window, or 0 where there is none.
+
+    The cell centres inside each feature's bounding box are listed with
+    array arithmetic, from the row and column numbers of the whole grid so
+    that the result does not depend on the window, and tested with
+    shapely.intersects_xy a batch of features at a time. Centres on an edge
+    shared by two features go to the later one, as every later feature
+    overwrites the earlier ones.
+    """
+    import shapely
+
+    cell_size, left, top = transform.a, transform.c, transform.f
+    row_stop = window.row_off + window.height
+    # Range of the cell centres within each bounding box, clipped to the window
+    col0 = np.maximum(np.ceil((geometry_bounds[:, 0] - left) / cell_size - 0.5), window.col_off).astype(np.int64)
+    col1 = np.minimum(np.floor((geometry_bounds[:, 2] - left) / cell_size - 0.5),
+                      window.col_off + window.width - 1).astype(np.int64)
+    row0 = np.maximum(np.ceil((top - geometry_bounds[:, 3]) / cell_size - 0.5), window.row_off).astype(np.int64)
+    row1 = np.minimum(np.floor((top - geometry_bounds[:, 1]) / cell_size - 0.5), row_stop - 1).astype(np.int64)
+    n_cols = np.maximum(col1 - col0 + 1, 0)
+    counts = n_cols * np.maximum(row1 - row0 + 1, 0)
+
+    index = np.zeros(window.height * window.width, dtype=np.int32)
+    features = np.flatnonzero(counts)
+    # Split the features into batches of about max_candidates cell centres
+    ends = np.cumsum(counts[features])
+    cuts = np.searchsorted(ends, np.arange(max_candidates, ends[-1] if len(ends) else 0, max_candidates), side="right")
+    for batch in np.split(features, cuts):
+        if not len(batch):
+            continue
+        batch_counts = counts[batch]
+        feature = np.repeat(batch, batch_counts)
+        offset = np.arange(len(feature)) - np.repeat(np.cumsum(batch_counts) - batch_counts, batch_counts)
+        cols = col0[feature] + offset % n_cols[feature]
+        rows = row0[feature] + offset // n_cols[feature]
+        hit = shapely.intersects_xy(geometries[feature], left + (cols + 0.5) * cell_size, top - (rows + 0.5) * cell_size)
+        cells = (rows[hit] - window.row_off) * window.width + (cols[hit] - window.col_off)
+        np.maximum.at(index, cells, (feature[hit] + 1).astype(np.int32))
+    return index.reshape(window.height, window.width)
+
+def rasterize_zones(shapefile_path, output_folder, attributes, cell_size, area=None, options=None):
+    """Rasterize several attributes of one "2D Zones.shp" to GeoTIFF in a single pass over its geometry.
+
+    The layer is read once, and the index of the feature holding each cell
+    centre is burned one strip of rows at a time, as in burn_index. Every attribute's
+    raster is then filled from that index. Cells no feature covers are set
+    to NODATA. If an area of interest is given, only the features touching
+    it are read, and the extent is clipped to it; the cells of a polygon
+    area whose centres fall outside it are set to NODATA too, as the
+    features that touch the polygon only cover part of its bounding box.
+    Returns the paths of the rasters written, in the order of the
+    attributes.
+    """
+    import pyogrio
+    import rasterio
+    import shapely
+    from rasterio.features import geometry_mask
+    from rasterio.windows import Window, transform as window_transform
+
+    info = pyogrio.read_info(shapefile_path, force_total_bounds=True)
+    area = read_area(area, info["crs"])
+    bounds = info["total_bounds"]
+    if area is not None:
+        bounds = aligned_extent(bounds, area_bounds(area), cell_size)
+        if bounds is None:
+            return []
+    meta, table = pyogrio.read_arrow(shapefile_path, columns=list(attributes), **spatial_filter(area))
+    if not table.num_rows:
+        return []
+
+    geometries = shapely.from_wkb(table[geometry_column(meta)].to_numpy(zero_copy_only=False))
+    # Prepared geometries test each cell centre about three times faster
+    shapely.prepare(geometries)
+    geometry_bounds = shapely.bounds(geometries)
+    # Index 0 is for the cells no feature covers
+    lookups = [np.concatenate([[NODATA], table[attribute].to_numpy(zero_copy_only=False).astype(np.float64)])
+               for attribute in attributes]
+
+    transform, width, height = extent_grid(bounds, cell_size)
+    strip_rows = max(BLOCK_SIZE, STRIP_CELLS // width // BLOCK_SIZE * BLOCK_SIZE)
+    profile = {"driver": "GTiff", "width": width, "height": height, "count": 1, "dtype": "float64",
+               "crs": info["crs"], "transform": transform, "nodata": NODATA,
+               "tiled": True, "blockxsize": BLOCK_SIZE, "blockysize": BLOCK_SIZE}
+    folder_name = os.path.basename(os.path.dirname(shapefile_path))
+    outputs = [os.path.join(output_folder, raster_name(folder_name, attribute)) for attribute in attributes]
+
+    with rasterio.Env(**(options or {})), ExitStack() as stack:
+        datasets = [stack.enter_context(rasterio.open(path, "w", **profile)) for path in outputs]
+        for row_off in range(0, height, strip_rows):
+            window = Window(0, row_off, width, min(strip_rows, height - row_off))
+            index = burn_index(geometries, geometry_bounds, transform, window)
+            if area is not None and not isinstance(area, tuple):
+                index[geometry_mask([area], out_shape=index.shape, transform=window_transform(window, transform))] = 0
+            for dataset, lookup in zip(datasets, lookups):
+                dataset.write(lookup[index], 1, window=window)
+    return outputs
+
+def rasterize_shapefiles(input_folders, output_folder, raster_types, cell_size, area=None, max_workers=None):
+    """Rasterize every "2D Zones.shp" under the input folders to GeoTIFF, one process per shapefile.
+
+    Each shapefile is read once for all the attributes in raster_types, as
+    in rasterize_zones, and the output files are named after the folder
+    holding it. If an area of interest is given (a bounding box or the
+    path of a polygon layer, as in maup_tools.vectors.read_area), only the
+    features touching it are rasterized, onto an extent clipped to it and
+    masked to a polygon.
+    Returns the paths of the rasters written.
+    """
+    shapefiles = find_zone_shapefiles(input_folders)
+    # Workers are separate processes, so they are given the GDAL options configured here
+    job = partial(rasterize_zones, output_folder=output_folder, attributes=list(raster_types),
+                  cell_size=cell_size, area=area, options=dict(gdal_options))
+    with record_operation(f"rasterize {', '.join(raster_types)}", output_folder) as trace:
+        outputs = [path for paths in map_in_processes(job, shapefiles, max_workers, preload=[__name__])
+                   for path in paths]
+        trace.bytes_written = sum(os.path.getsize(path) for path in outputs)
+        if outputs:
+            trace.layout = inspect_layout(outputs[0])
+    return outputs
@@ -0,0 +1,51 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+
+def partial_flow_area(diameter, depth):
+    """Calculate the cross-sectional area of flow in a partially full circular pipe."""
+    if depth <= 0:
+        return 0
+    if depth >= diameter:
+        return (math.pi * diameter**2) / 4
+    theta = 2 * math.acos((diameter - 2 * depth) / diameter)
+    area = (diameter**2 / 8) * (theta - math.sin(theta))
+    return area
+
+def partial_flow_hydraulic_radius(diameter, depth):
+    """Calculate the hydraulic radius of flow in a partially full circular pipe."""
+    if depth <= 0:
+        return 0
+    if depth >= diameter:
+        return diameter / 4
+    theta = 2 * math.acos((diameter - 2 * depth) / diameter)
+    wetted_perimeter = diameter * theta / 2
+    area = partial_flow_area(diameter, depth)
+    return area / wetted_perimeter
+
+def flow_rate(diameter, slope, manning_n, depth):
+    """Calculate the flow rate for a given depth in a circular pipe using Manning's equation."""
+    area = partial_flow_area(diameter, depth)
+    hydraulic_radius = partial_flow_hydraulic_radius(diameter, depth)
+    if hydraulic_radius == 0:
+        return 0
+    flow_rate = (1 / manning_n) * area * (hydraulic_radius**(2/3)) * (slope**0.5)
+    return flow_rate
+
+def generate_rating_curve(diameter, slope, manning_n, invert_level, num_points=100):
+    """Generate a rating curve for a circular pipe."""
+    depths = np.linspace(0, diameter, num_points)
+    elevations = invert_level + depths
+    flow_rates = [flow_rate(diameter, slope, manning_n, depth) for depth in depths]
+
+    # Create a DataFrame
+    data = {
+        # 'Depth (m)': depths,
+        'Elevation (mOD)': elevations,
+        'Flow (m³/s)': flow_rates
+    }
+    df = pd.DataFrame(data)
+
+    return df
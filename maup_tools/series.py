@@ -0,0 +1,19 @@
+import numpy as np
+
+
+def exceedance_runs(values, threshold):
+    """Find the contiguous runs of values at or above a threshold.
+
+    Returns the start index, the stop index (exclusive) and the peak value of
+    every run.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    above = np.concatenate([[False], values >= threshold, [False]])
+    changes = np.flatnonzero(above[1:] != above[:-1])
+    starts, stops = changes[::2], changes[1::2]
+    if not len(starts):
+        return starts, stops, np.zeros(0)
+    # Maximum over each [start, stop) segment in one call
+    padded = np.append(values, -np.inf)
+    peaks = np.maximum.reduceat(padded, np.column_stack([starts, stops]).ravel())[::2]
+    return starts, stops, peaks
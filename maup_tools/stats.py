@@ -0,0 +1,222 @@
+import math
+from functools import partial
+
+import numpy as np
+
+from .histogram import bin_block, check_bin_edges, generate_bin_labels, valid_values
+from .raster_io import open_raster, read_band, run_in_threads
+
+PERCENTILES = (1, 5, 95, 99)
+
+
+def ordinal(n):
+    """Return 1st, 2nd, 3rd, 4th ... for an integer."""
+    suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
+
+
+class RunningMoments:
+    """Count, min, max, mean and variance updated one block at a time (Welford/Chan)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _combine(self, count, mean, m2, minimum, maximum):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+
+    def update(self, values):
+        if values.size:
+            values = values.astype(np.float64, copy=False)
+            mean = values.mean()
+            self._combine(values.size, mean, np.sum((values - mean) ** 2), values.min(), values.max())
+
+    def merge(self, other):
+        if other.count:
+            self._combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / self.count) if self.count else math.nan
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with a bounded relative error (DDSketch).
+
+    Magnitudes are counted in logarithmic buckets, so every quantile is
+    returned within relative_accuracy of a true value. Magnitudes below
+    min_value are counted as zero.
+    """
+
+    def __init__(self, relative_accuracy=0.005, min_value=1e-6):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self._offset = math.ceil(math.log(min_value) / self._log_gamma)
+        self.positive = np.zeros(0, dtype=np.int64)
+        self.negative = np.zeros(0, dtype=np.int64)
+        self.zero_count = 0
+        self.count = 0
+
+    def _add(self, store, magnitudes):
+        if not magnitudes.size:
+            return store
+        keys = np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64) - self._offset
+        counts = np.bincount(np.maximum(keys, 0))
+        return add_counts(store, counts)
+
+    def update(self, values):
+        values = values.astype(np.float64, copy=False)
+        small = np.abs(values) < self.min_value
+        self.zero_count += int(np.count_nonzero(small))
+        self.positive = self._add(self.positive, values[(values > 0) & ~small])
+        self.negative = self._add(self.negative, -values[(values < 0) & ~small])
+        self.count += values.size
+
+    def merge(self, other):
+        if (other.relative_accuracy, other.min_value) != (self.relative_accuracy, self.min_value):
+            raise ValueError("Only sketches with the same accuracy can be merged.")
+        self.positive = add_counts(self.positive, other.positive)
+        self.negative = add_counts(self.negative, other.negative)
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def _bucket_values(self, n_buckets):
+        # The estimate that is within the relative accuracy of every value in the bucket
+        return 2 * self.gamma ** (np.arange(n_buckets) + self._offset) / (self.gamma + 1)
+
+    def quantile(self, q):
+        """Estimate the q-th quantile (0 <= q <= 1)."""
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        # Buckets in increasing value order: negatives (largest magnitude first), zero, positives
+        counts = np.concatenate([self.negative[::-1], [self.zero_count], self.positive])
+        values = np.concatenate([-self._bucket_values(len(self.negative))[::-1], [0.0],
+                                 self._bucket_values(len(self.positive))])
+        index = np.searchsorted(np.cumsum(counts), rank, side='right')
+        return float(values[min(index, len(values) - 1)])
+
+
+def add_counts(store, counts):
+    """Add bucket counts to a store, growing it as needed."""
+    if len(counts) > len(store):
+        store = np.pad(store, (0, len(counts) - len(store)))
+    else:
+        store = store.copy()
+    store[:len(counts)] += counts
+    return store
+
+
+class RasterSummary:
+    """Histogram counts, moments, quantile sketch and threshold exceedance counts of a raster.
+
+    Summaries of separate blocks can be merged, so the work can be split
+    across workers.
+    """
+
+    def __init__(self, bin_edges, thresholds=(), relative_accuracy=0.005):
+        self.edges = check_bin_edges(bin_edges)
+        self.thresholds = np.sort(np.asarray(thresholds, dtype=np.float64))
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64)
+        self.exceedance_counts = np.zeros(len(self.thresholds), dtype=np.int64)
+        self.moments = RunningMoments()
+        self.sketch = QuantileSketch(relative_accuracy)
+        self.cell_area = None
+
+    def update(self, values):
+        if not values.size:
+            return
+        self.counts += bin_block(values, self.edges)
+        if len(self.thresholds):
+            # Number of thresholds strictly below each value, turned into counts above each threshold
+            below = np.bincount(np.searchsorted(self.thresholds, values, side='left'),
+                                minlength=len(self.thresholds) + 1)
+            self.exceedance_counts += np.cumsum(below[::-1])[::-1][1:]
+        self.moments.update(values)
+        self.sketch.update(values)
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.exceedance_counts += other.exceedance_counts
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def bin_counts(self):
+        return self.counts[1:-1]
+
+    @property
+    def n_total(self):
+        return int(self.counts.sum())
+
+    @property
+    def bin_percentages(self):
+        if not self.n_total:
+            return np.zeros(len(self.bin_counts))
+        return self.bin_counts / self.n_total * 100
+
+    def statistics(self, percentiles=PERCENTILES):
+        """Return the summary statistics, labelled for display."""
+        stats = {
+            "Minimum": self.moments.min if self.moments.count else math.nan,
+            "Maximum": self.moments.max if self.moments.count else math.nan,
+            "Mean": self.moments.mean if self.moments.count else math.nan,
+            "Standard deviation": self.moments.std,
+        }
+        for p in percentiles:
+            stats[f"{ordinal(p)} percentile"] = self.sketch.quantile(p / 100)
+        return stats
+
+    def exceedance_areas(self):
+        """Return the area of the cells above each threshold."""
+        return {float(t): int(n) * self.cell_area for t, n in zip(self.thresholds, self.exceedance_counts)}
+
+
+def _summarise_windows(raster_path, windows, bin_edges, thresholds):
+    summary = RasterSummary(bin_edges, thresholds)
+    with open_raster(raster_path) as src:
+        for window in windows:
+            summary.update(valid_values(read_band(src, window)))
+    return [summary]
+
+def summarise_raster(raster_path, bin_edges, thresholds=(), max_workers=None):
+    """Summarise a stage difference raster in one block-wise pass, split across a thread pool.
+
+    Each worker builds a RasterSummary from its share of the blocks, and the
+    partial summaries are merged.
+    """
+    with open_raster(raster_path) as src:
+        cell_area = abs(src.transform.a * src.transform.e)
+        windows = [window for _, window in src.block_windows(1)]
+
+    worker = partial(_summarise_windows, bin_edges=bin_edges, thresholds=thresholds)
+    summary = RasterSummary(bin_edges, thresholds)
+    for part in run_in_threads(raster_path, worker, windows, max_workers):
+        summary.merge(part)
+    summary.cell_area = cell_area
+    return summary
+
+def histogram_report(summary):
+    """Collect the bin percentages, statistics and threshold areas of a RasterSummary for export."""
+    bins = [{"Bin": label, "Cells": int(count), "Percentage": float(percentage)}
+            for label, count, percentage in zip(generate_bin_labels(summary.edges.tolist()),
+                                                summary.bin_counts, summary.bin_percentages)]
+    return {
+        "valid_cells": summary.n_total,
+        "cell_area": summary.cell_area,
+        "bins": bins,
+        "statistics": {name: float(value) for name, value in summary.statistics().items()},
+        "exceedance_areas": [{"Threshold": threshold, "Area": area}
+                             for threshold, area in summary.exceedance_areas().items()],
+    }
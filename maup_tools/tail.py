@@ -0,0 +1,120 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from .tuflow import COURANT_COLUMNS, MB_COLUMNS
+
+
+class CsvTail:
+    """Follow a CSV file that is still being written.
+
+    Each poll reads from the last byte offset, parses only the complete lines
+    appended since, and appends them to a growable columnar buffer, so a
+    refresh parses only the new rows.
+    """
+
+    columns = []
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.length = 0
+        self._usecols = None
+        self._names = None
+        self._buffer = None
+
+    def _reset(self):
+        self.offset = 0
+        self.length = 0
+        self._usecols = None
+        self._buffer = None
+
+    def _read_header(self, line):
+        raw_names = [name.strip() for name in line.decode('utf-8-sig').rstrip('\r\n').split(',')]
+        missing = [column for column in self.columns if column not in raw_names]
+        if missing:
+            raise ValueError(f"missing the required columns {', '.join(repr(column) for column in missing)}")
+        self._usecols = [raw_names.index(column) for column in self.columns]
+
+    def _append(self, values):
+        """Append rows to the buffer, doubling its capacity when full."""
+        if self._buffer is None:
+            self._buffer = np.empty((len(self._names), max(1024, len(values))))
+        needed = self.length + len(values)
+        if needed > self._buffer.shape[1]:
+            grown = np.empty((self._buffer.shape[0], max(needed, 2 * self._buffer.shape[1])))
+            grown[:, :self.length] = self._buffer[:, :self.length]
+            self._buffer = grown
+        self._buffer[:, self.length:needed] = values.T
+        self.length = needed
+
+    def derive(self, new):
+        """Return the new rows with any derived columns added; columns may depend on earlier rows."""
+        return new
+
+    def poll(self):
+        """Parse the complete lines appended since the last poll, returning the number of new rows."""
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < self.offset:
+                # The file was rewritten, for example by a restarted run
+                self._reset()
+            f.seek(self.offset)
+            chunk = f.read(size - self.offset)
+
+        # Leave a partly written last line for the next poll
+        end = chunk.rfind(b'\n')
+        if end < 0:
+            return 0
+        complete = chunk[:end + 1]
+
+        if self._usecols is None:
+            header_end = complete.index(b'\n') + 1
+            # The offset stays at the header until it is accepted, so a bad header is not skipped
+            self._read_header(complete[:header_end])
+            complete = complete[header_end:]
+        self.offset += end + 1
+        if not complete.strip():
+            return 0
+
+        new = pd.read_csv(io.BytesIO(complete), header=None, usecols=self._usecols, dtype=np.float64)
+        new = new[self._usecols]
+        new.columns = self.columns
+        new = self.derive(new)
+        self._names = list(new.columns)
+        self._append(new.to_numpy(dtype=np.float64))
+        return len(new)
+
+    def data(self):
+        """Return the rows read so far as a DataFrame that shares the buffer."""
+        if self._buffer is None:
+            return pd.DataFrame(columns=self._names or self.columns, dtype=np.float64)
+        return pd.DataFrame(self._buffer[:, :self.length].T, columns=self._names, copy=False)
+
+
+class MassBalanceTail(CsvTail):
+    """Follow a TUFLOW MB.csv file."""
+
+    columns = MB_COLUMNS
+
+
+class CourantTail(CsvTail):
+    """Follow a TUFLOW HPC.dt.csv file, cumulating the dtStar time axis as rows arrive."""
+
+    columns = ['dtStar'] + COURANT_COLUMNS
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._elapsed = 0.0
+
+    def _reset(self):
+        super()._reset()
+        self._elapsed = 0.0
+
+    def derive(self, new):
+        new['dtStar_divided'] = new['dtStar'] / 3600
+        new['dtStar_cumsum'] = self._elapsed + new['dtStar_divided'].cumsum()
+        self._elapsed = float(new['dtStar_cumsum'].iloc[-1])
+        return new
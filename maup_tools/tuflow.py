@@ -0,0 +1,186 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from .cache import ColumnStore, source_digest
+from .series import exceedance_runs
+
+MB_COLUMNS = ['Time (h)', 'dVol', 'Cum ME (%)']
+COURANT_COLUMNS = ['Nu', 'Nc', 'Nd']
+
+# Values at or above these may indicate a problem (see the Courant page)
+COURANT_THRESHOLDS = {'Nu': 1.0, 'Nc': 1.0, 'Nd': 0.3}
+
+# Parsed columns kept on disk between reruns and server restarts
+parsed_columns = ColumnStore(
+    os.environ.get("MAUP_PARSE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "maup_tools", "parsed")),
+    max_bytes=int(os.environ.get("MAUP_PARSE_CACHE_MB", 1024)) * 2**20,
+)
+
+
+def _read_header(file):
+    """Read the header line of a CSV path or file object, leaving file objects rewound."""
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as f:
+            header = f.readline()
+    else:
+        file.seek(0)
+        header = file.readline()
+        file.seek(0)
+    return header.decode('utf-8-sig').rstrip('\r\n').split(',')
+
+def read_columns(file, columns):
+    """Parse only the named columns of a CSV, ignoring whitespace around the header names.
+
+    Raises ValueError if any of the columns is missing.
+    """
+    raw_names = {name.strip(): name for name in _read_header(file)}
+    missing = [column for column in columns if column not in raw_names]
+    if missing:
+        raise ValueError(f"missing the required columns {', '.join(repr(column) for column in missing)}")
+    usecols = [raw_names[column] for column in columns]
+    try:
+        df = pd.read_csv(file, usecols=usecols, engine='pyarrow')
+    except ImportError:
+        if not isinstance(file, (str, os.PathLike)):
+            file.seek(0)
+        df = pd.read_csv(file, usecols=usecols)
+    df.columns = df.columns.str.strip()
+    return df[columns]
+
+def read_mass_balance(file):
+    """Read the Time (h), dVol and Cum ME (%) columns of a TUFLOW MB.csv file."""
+    return read_columns(file, MB_COLUMNS)
+
+def summarise_mass_balance(df, threshold=1.0):
+    """Summarise the cumulative mass error of one run against a threshold (%)."""
+    cum_me = df['Cum ME (%)'].to_numpy(dtype=np.float64)
+    # Empty and all-NaN columns have no peak
+    if np.isnan(cum_me).all():
+        return {"Peak |Cum ME| (%)": np.nan, "Final Cum ME (%)": np.nan, "Time of peak (h)": np.nan, "Pass": False}
+    peak = int(np.nanargmax(np.abs(cum_me)))
+    return {
+        "Peak |Cum ME| (%)": abs(cum_me[peak]),
+        "Final Cum ME (%)": cum_me[-1],
+        "Time of peak (h)": df['Time (h)'].iloc[peak],
+        "Pass": bool(abs(cum_me[peak]) <= threshold),
+    }
+
+def cached_read(file, reader):
+    """Return reader(file), cached on disk by the hash of the file's contents.
+
+    Server-side paths are only rehashed when their size or modification time
+    changes.
+    """
+    key = (source_digest(file), reader.__module__, reader.__qualname__)
+    return parsed_columns.get_or_parse(key, lambda: reader(file))
+
+def _file_name(file):
+    return os.path.basename(file) if isinstance(file, (str, os.PathLike)) else file.name
+
+def read_many(files, reader, max_workers=None):
+    """Parse many files with reader in a thread pool.
+
+    Returns the parsed results and the error message of each unreadable
+    file, both keyed by file name; runs with the same file name are kept
+    apart by a numbered suffix.
+    """
+    def parse(file):
+        try:
+            return reader(file), None
+        except Exception as e:
+            return None, str(e)
+
+    with ThreadPoolExecutor(max_workers=max_workers or min(32, (os.cpu_count() or 1) + 4)) as executor:
+        parsed = list(executor.map(parse, files))
+
+    frames, errors = {}, {}
+    for file, (df, error) in zip(files, parsed):
+        name = _file_name(file)
+        n = 2
+        while name in frames or name in errors:
+            name = f"{_file_name(file)} ({n})"
+            n += 1
+        if error is not None:
+            errors[name] = error
+        else:
+            frames[name] = df
+    return frames, errors
+
+def bulk_mass_balance(files, threshold=1.0, max_workers=None):
+    """Parse many MB.csv files in a thread pool and summarise each against the threshold.
+
+    Returns the summary DataFrame (one row per readable file), the parsed
+    DataFrames by file name, and the error message of each unreadable file.
+    """
+    frames, errors = read_many(files, partial(cached_read, reader=read_mass_balance), max_workers)
+    rows = [{"File": name, **summarise_mass_balance(df, threshold)} for name, df in frames.items()]
+    summary = pd.DataFrame(rows, columns=["File", "Peak |Cum ME| (%)", "Final Cum ME (%)", "Time of peak (h)", "Pass"])
+    return summary, frames, errors
+
+def read_courant(file):
+    """Read the dtStar, Nu, Nc and Nd columns of a TUFLOW HPC.dt.csv file and build the time axis.
+
+    'dtStar' is divided by 3600, and then it is cumulated to give the time in hours.
+    """
+    df = read_columns(file, ['dtStar'] + COURANT_COLUMNS)
+    df['dtStar_divided'] = df['dtStar'] / 3600
+    df['dtStar_cumsum'] = df['dtStar_divided'].cumsum()
+    return df
+
+def courant_events(df, thresholds=None):
+    """List every period where Nu, Nc or Nd are at or above their thresholds.
+
+    Each event starts when its first exceeding timestep starts and ends when
+    its last exceeding timestep ends, on the cumulated dtStar time axis.
+    """
+    thresholds = thresholds or COURANT_THRESHOLDS
+    time = df['dtStar_cumsum'].to_numpy(dtype=np.float64)
+    step_start = time - df['dtStar_divided'].to_numpy(dtype=np.float64)
+    events = []
+    for column, threshold in thresholds.items():
+        starts, stops, peaks = exceedance_runs(df[column].to_numpy(), threshold)
+        events.append(pd.DataFrame({
+            "Variable": column,
+            "Threshold": threshold,
+            "Start (h)": step_start[starts],
+            "End (h)": time[stops - 1],
+            "Duration (h)": time[stops - 1] - step_start[starts],
+            "Timesteps": stops - starts,
+            "Peak": peaks,
+        }))
+    return pd.concat(events, ignore_index=True).sort_values("Start (h)", kind="stable", ignore_index=True)
+
+def summarise_courant(df, events):
+    """Summarise the exceedance events of one run for the cross-file table."""
+    summary = {}
+    for column in COURANT_COLUMNS:
+        summary[f"{column} events"] = int((events['Variable'] == column).sum())
+    for column in COURANT_COLUMNS:
+        summary[f"Max {column}"] = df[column].max()
+    summary["Time exceeding (h)"] = events['Duration (h)'].sum()
+    summary["Pass"] = events.empty
+    return summary
+
+def bulk_courant(files, thresholds=None, max_workers=None):
+    """Parse many HPC.dt.csv files in a thread pool and find their exceedance events.
+
+    Returns the cross-file summary DataFrame, the events of every run in one
+    DataFrame with a File column, the parsed DataFrames by file name, and the
+    error message of each unreadable file.
+    """
+    frames, errors = read_many(files, partial(cached_read, reader=read_courant), max_workers)
+    rows, all_events = [], []
+    for name, df in frames.items():
+        events = courant_events(df, thresholds)
+        rows.append({"File": name, **summarise_courant(df, events)})
+        all_events.append(events.assign(File=name))
+    columns = (["File"] + [f"{c} events" for c in COURANT_COLUMNS] + [f"Max {c}" for c in COURANT_COLUMNS]
+               + ["Time exceeding (h)", "Pass"])
+    summary = pd.DataFrame(rows, columns=columns)
+    events = pd.concat(all_events, ignore_index=True) if all_events else pd.DataFrame(columns=["File"])
+    events = events[["File"] + [c for c in events.columns if c != "File"]]
+    return summary, events, frames, errors
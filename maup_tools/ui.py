@@ -0,0 +1,40 @@
+import pandas as pd
+import streamlit as st
+
+from .plotting import render_figure
+from .raster_io import cached_raster_result, gdal_options, inspect_layout, io_log, layout_warnings
+
+
+def gdal_settings_panel():
+    """Let the user tune the GDAL options that every raster is opened under."""
+    with st.sidebar.expander("GDAL settings"):
+        st.caption("These settings apply to every raster opened by this server.")
+        gdal_options["GDAL_CACHEMAX"] = st.number_input(
+            "Block cache size (MB):", min_value=16, value=int(gdal_options["GDAL_CACHEMAX"]), step=64)
+        gdal_options["GDAL_NUM_THREADS"] = st.text_input(
+            "Decoding threads (GDAL_NUM_THREADS):", value=str(gdal_options["GDAL_NUM_THREADS"]))
+
+def raster_diagnostics_panel(raster=None):
+    """Warn about slow raster layouts and show the recent raster operations in a collapsible panel."""
+    layout = None
+    if raster is not None:
+        layout = cached_raster_result(raster, inspect_layout)
+        for warning in layout_warnings(layout):
+            st.warning(warning)
+
+    with st.expander("Raster I/O diagnostics"):
+        if layout is not None:
+            st.write("Input layout:")
+            st.json({key: layout[key] for key in ("driver", "size", "dtype", "block", "tiled", "compression", "overviews")})
+        st.write("GDAL options:")
+        st.json(dict(gdal_options))
+        if io_log:
+            st.write("Recent raster operations on this server (cached results are not read again):")
+            st.dataframe(pd.DataFrame([trace.as_row() for trace in reversed(io_log)]), hide_index=True)
+        else:
+            st.write("No raster operations have run yet.")
+
+def show_chart(draw, *data, fmt="png", cached=True, **options):
+    """Display a chart through the shared cache of rendered charts, or without it if cached is False."""
+    image = render_figure(draw, *data, fmt=fmt, cached=cached, **options)
+    st.image(image.decode() if fmt == "svg" else image)
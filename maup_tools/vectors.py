@@ -0,0 +1,351 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+
+# Output formats by file extension, and the OGR driver that writes each; GeoParquet is written by pyarrow
+VECTOR_DRIVERS = {
+    ".shp": "ESRI Shapefile",
+    ".gpkg": "GPKG",
+    ".fgb": "FlatGeobuf",
+    ".parquet": None,
+    ".geoparquet": None,
+}
+
+# Bytes of the input layer decoded into one partition, at most
+PARTITION_BYTES = 64 * 2**20
+
+# Feature IDs OGR accepts in one read; its SQL dialect limits the length of the filter it builds from them
+FID_BATCH = 4997
+
+
+def output_driver(output_path):
+    """Return the OGR driver that writes an output path, or None for GeoParquet.
+
+    Raises ValueError for an extension that is not supported.
+    """
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension not in VECTOR_DRIVERS:
+        raise ValueError(f"The output must end with one of {', '.join(VECTOR_DRIVERS)}.")
+    return VECTOR_DRIVERS[extension]
+
+def layer_nbytes(file_path):
+    """Size of a vector layer on disk, counting the attribute table of a shapefile."""
+    root, extension = os.path.splitext(file_path)
+    if extension.lower() != ".shp":
+        return os.path.getsize(file_path)
+    return sum(os.path.getsize(root + sidecar) for sidecar in (".shp", ".dbf") if os.path.exists(root + sidecar))
+
+def plan_partitions(n_features, nbytes, max_workers=None, partition_bytes=PARTITION_BYTES):
+    """Split the features of a layer into contiguous (skip, count) partitions.
+
+    There are at least as many partitions as workers, so every core has
+    work, and enough that no partition decodes more than about
+    partition_bytes of the input.
+    """
+    if not n_features:
+        return []
+    n_workers = max(1, max_workers or os.cpu_count() or 1)
+    n_partitions = min(n_features, max(n_workers, math.ceil(nbytes / partition_bytes)))
+    bounds = np.linspace(0, n_features, n_partitions + 1).astype(np.int64)
+    return [(int(start), int(stop - start)) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+def parse_area(text):
+    """Parse an area of interest typed by the user: 'minx, miny, maxx, maxy' or the path of a polygon layer.
+
+    Returns None for blank text, the bounding box as a tuple of floats, or
+    the path. Raises ValueError if the text is neither.
+    """
+    text = text.strip().strip('"')
+    if not text:
+        return None
+    parts = text.split(",")
+    if len(parts) == 4:
+        try:
+            minx, miny, maxx, maxy = (float(part) for part in parts)
+        except ValueError:
+            pass
+        else:
+            if minx >= maxx or miny >= maxy:
+                raise ValueError("The bounding box must be given as minx, miny, maxx, maxy.")
+            return minx, miny, maxx, maxy
+    if not os.path.exists(text):
+        raise ValueError(f"The area of interest is neither a bounding box nor an existing file: {text}")
+    return text
+
+def read_area(area, crs=None):
+    """Return an area of interest as a bounding box tuple, or as one polygon in the CRS of the layer it filters.
+
+    area is a (minx, miny, maxx, maxy) tuple in that CRS, returned as it
+    is, or the path of a polygon layer whose features are merged.
+    """
+    if area is None or isinstance(area, tuple):
+        return area
+    import geopandas as gpd
+    import shapely
+
+    gdf = gpd.read_file(area)
+    if crs is not None and gdf.crs is not None and gdf.crs != crs:
+        gdf = gdf.to_crs(crs)
+    return shapely.union_all(gdf.geometry.values)
+
+def area_bounds(area):
+    """The bounding box of an area read by read_area."""
+    return area if isinstance(area, tuple) else tuple(area.bounds)
+
+def spatial_filter(area):
+    """pyogrio read options that make OGR skip the features outside an area read by read_area."""
+    if area is None:
+        return {}
+    return {"bbox": area} if isinstance(area, tuple) else {"mask": area}
+
+def layer_partitions(file_path, info, area=None, max_workers=None, partition_bytes=PARTITION_BYTES):
+    """Plan the partitions a layer is read in, as pyogrio read options, keeping to an area of interest if given.
+
+    Without an area, partitions are contiguous runs of features, which OGR
+    seeks to directly. With one, the IDs of the features inside it are
+    found first, with a read of their geometries alone, and split into
+    partitions sized from their share of the file. Each partition then
+    reads its own features by ID, as skipping features under a spatial
+    filter would make OGR read again all the features before them.
+    """
+    import pyogrio
+
+    n_features, nbytes = info["features"], layer_nbytes(file_path)
+    filters = spatial_filter(area)
+    if not filters:
+        return [{"skip_features": skip, "max_features": count}
+                for skip, count in plan_partitions(n_features, nbytes, max_workers, partition_bytes)]
+    meta, table = pyogrio.read_arrow(file_path, columns=[], return_fids=True, **filters)
+    fids = table[meta["fid_column"]].to_numpy()
+    nbytes = nbytes * len(fids) // max(1, n_features)
+    return [{"fids": fids[skip:skip + count]}
+            for skip, count in plan_partitions(len(fids), nbytes, max_workers, partition_bytes)]
+
+def map_partitions(function, partitions, max_workers=None):
+    """Call function on every partition in a thread pool, yielding the results in order as they complete.
+
+    At most twice as many partitions as workers are in flight, so memory
+    holds a few partitions rather than the whole layer. pyogrio and shapely
+    release the GIL while they decode and compute.
+    """
+    n_workers = max(1, max_workers or os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        pending = []
+        for partition in partitions:
+            pending.append(executor.submit(function, partition))
+            if len(pending) >= 2 * n_workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+def _geoparquet_metadata(geometry_name, geometry_type, crs):
+    import json
+
+    from pyproj import CRS
+
+    column = {"encoding": "WKB", "geometry_types": [geometry_type]}
+    if crs is not None:
+        column["crs"] = CRS.from_user_input(crs).to_json_dict()
+    return {b"geo": json.dumps({"version": "1.0.0", "primary_column": geometry_name,
+                                "columns": {geometry_name: column}}).encode()}
+
+
+class PartitionWriter:
+    """Write Arrow tables of features to one vector layer, appending each table as it arrives.
+
+    OGR formats are written through pyogrio's Arrow path; GeoParquet is
+    written one row group per table by pyarrow, with the geometry column
+    named 'geometry'.
+    """
+
+    def __init__(self, output_path, geometry_name, geometry_type, crs=None):
+        self.output_path = output_path
+        self.driver = output_driver(output_path)
+        self.geometry_name = geometry_name
+        self.geometry_type = geometry_type
+        self.crs = crs
+        self.count = 0
+        self._parquet = None
+        self._started = False
+
+    def write(self, table):
+        if self.driver is None:
+            import pyarrow.parquet as pq
+
+            table = table.rename_columns(["geometry" if name == self.geometry_name else name
+                                          for name in table.column_names])
+            if self._parquet is None:
+                schema = table.schema.with_metadata(_geoparquet_metadata("geometry", self.geometry_type, self.crs))
+                self._parquet = pq.ParquetWriter(self.output_path, schema)
+            self._parquet.write_table(table.replace_schema_metadata(self._parquet.schema.metadata))
+        else:
+            import pyogrio
+
+            pyogrio.write_arrow(table, self.output_path, driver=self.driver, geometry_name=self.geometry_name,
+                                geometry_type=self.geometry_type, crs=self.crs, append=self._started)
+        self._started = True
+        self.count += len(table)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def geometry_column(info):
+    """Name of the WKB geometry column in the Arrow tables read from a layer, given its pyogrio info."""
+    return info["geometry_name"] or "wkb_geometry"
+
+def read_partition(file_path, partition, columns=None):
+    """Read one partition of a layer, planned by layer_partitions, as an Arrow table with WKB geometries."""
+    import pyarrow as pa
+    import pyogrio
+
+    if "fids" not in partition:
+        return pyogrio.read_arrow(file_path, columns=columns, **partition)[1]
+    fids = partition["fids"]
+    return pa.concat_tables([pyogrio.read_arrow(file_path, columns=columns, fids=fids[start:start + FID_BATCH])[1]
+                             for start in range(0, len(fids), FID_BATCH)])
+
+def _wet_elements(table, geometry_name):
+    """Keep the wet rows of a 2D zones table, returning them with their polygons and X and Y velocity components."""
+    import shapely
+
+    # Filter out rows with zero DEPTH2D, i.e. remove rows of 0 depths
+    table = table.filter(table['DEPTH2D'].to_numpy() != 0)
+    polygons = shapely.from_wkb(table[geometry_name].to_numpy(zero_copy_only=False))
+
+    # Calculate X and Y components
+    speed = table['SPEED2D'].to_numpy()
+    angle = table['MAXANGLE2D'].to_numpy()
+    return table, polygons, speed * np.cos(angle), speed * np.sin(angle)
+
+def zone_points(table, geometry_name):
+    """Turn the wet 2D zone polygons of an Arrow table into centroid points with X and Y velocity components."""
+    import pyarrow as pa
+    import shapely
+
+    table, polygons, x, y = _wet_elements(table, geometry_name)
+
+    # Replace each polygon by its centroid
+    centroids = pa.array(shapely.to_wkb(shapely.centroid(polygons)), type=pa.binary())
+    table = table.set_column(table.schema.get_field_index(geometry_name), geometry_name, centroids)
+    return table.append_column('X', pa.array(x)).append_column('Y', pa.array(y))
+
+def grid_origin(bounds, cell_size):
+    """The lower left corner of the grid of cell_size cells covering the bounds, on a multiple of the cell size."""
+    return math.floor(bounds[0] / cell_size) * cell_size, math.floor(bounds[1] / cell_size) * cell_size
+
+def grid_sums(table, geometry_name, cell_size, origin, n_cols):
+    """Bin the centroids of the wet elements onto a regular grid and sum their weighted values per cell.
+
+    Returns the index of every cell holding an element (row * n_cols + col)
+    and, per cell, the element count, the wet area and the area-weighted
+    sums of X, Y, SPEED2D and DEPTH2D.
+    """
+    import shapely
+
+    table, polygons, x, y = _wet_elements(table, geometry_name)
+    area = shapely.area(polygons)
+    coords = shapely.get_coordinates(shapely.centroid(polygons))
+    cols = np.floor((coords[:, 0] - origin[0]) / cell_size).astype(np.int64)
+    rows = np.floor((coords[:, 1] - origin[1]) / cell_size).astype(np.int64)
+    cells, inverse = np.unique(rows * n_cols + cols, return_inverse=True)
+    weights = [np.ones_like(area), area, area * x, area * y,
+               area * table['SPEED2D'].to_numpy(), area * table['DEPTH2D'].to_numpy()]
+    return cells, np.stack([np.bincount(inverse, w, minlength=len(cells)) for w in weights], axis=1)
+
+def _zone_points_partition(file_path, geometry_name, partition):
+    return zone_points(read_partition(file_path, partition), geometry_name)
+
+def process_shapefile(file_path, output_path, area=None, max_workers=None, partition_bytes=PARTITION_BYTES):
+    """Convert the wet 2D zone polygons of an ICM "2D Zones.shp" to centroid points with X and Y velocity components.
+
+    The mesh is read in partitions sized from the number of cores and the
+    size of the file, converted in a thread pool, and each partition is
+    written as soon as it and the ones before it are done, so peak memory
+    is a few partitions rather than the whole mesh. The output format
+    follows its extension: Shapefile, GeoPackage, FlatGeobuf or GeoParquet;
+    the formats other than Shapefile have no 2 GB limit. If an area of
+    interest is given (see read_area), only the elements touching it are
+    read. Returns the number of points written.
+    """
+    import pyogrio
+
+    output_driver(output_path)
+    info = pyogrio.read_info(file_path)
+    partitions = layer_partitions(file_path, info, read_area(area, info["crs"]), max_workers, partition_bytes)
+    geometry_name = geometry_column(info)
+
+    with PartitionWriter(output_path, geometry_name, "Point", info["crs"]) as writer:
+        for points in map_partitions(partial(_zone_points_partition, file_path, geometry_name),
+                                     partitions, max_workers):
+            writer.write(points)
+    return writer.count
+
+def _grid_sums_partition(file_path, geometry_name, cell_size, origin, n_cols, partition):
+    return grid_sums(read_partition(file_path, partition), geometry_name, cell_size, origin, n_cols)
+
+def grid_vectors(file_path, output_path, cell_size, area=None, max_workers=None, partition_bytes=PARTITION_BYTES):
+    """Aggregate the wet 2D zone elements of an ICM "2D Zones.shp" into one velocity vector point per grid cell.
+
+    Element centroids are binned onto a regular grid of cell_size cells,
+    aligned to multiples of the cell size, partition by partition as in
+    process_shapefile. Each cell with a wet element becomes a point at the
+    cell centre, with the area-weighted means of X, Y, SPEED2D and DEPTH2D,
+    MAXANGLE2D as the direction of the mean vector, the wet area AREA2D and
+    the number of ELEMENTS, so Point_Vectors.qml styles it as it does the
+    element points. If an area of interest is given, only the elements
+    touching it are read. Returns the number of points written.
+    """
+    import pyarrow as pa
+    import pyogrio
+    import shapely
+
+    if cell_size <= 0:
+        raise ValueError("The grid cell size must be greater than zero.")
+    output_driver(output_path)
+    info = pyogrio.read_info(file_path, force_total_bounds=True)
+    partitions = layer_partitions(file_path, info, read_area(area, info["crs"]), max_workers, partition_bytes)
+    geometry_name = geometry_column(info)
+    # The grid covers the whole layer, so it lines up whatever the area of interest
+    origin = grid_origin(info["total_bounds"], cell_size)
+    n_cols = math.floor((info["total_bounds"][2] - origin[0]) / cell_size) + 1
+
+    # Each partition gives its sums for the cells it touches; cells split between partitions are added up here
+    cells, sums = [np.zeros(0, dtype=np.int64)], [np.zeros((0, 6))]
+    for partition_cells, partition_sums in map_partitions(
+            partial(_grid_sums_partition, file_path, geometry_name, cell_size, origin, n_cols), partitions, max_workers):
+        cells.append(partition_cells)
+        sums.append(partition_sums)
+    cells, inverse = np.unique(np.concatenate(cells), return_inverse=True)
+    sums = np.concatenate(sums)
+    totals = np.stack([np.bincount(inverse, sums[:, i], minlength=len(cells)) for i in range(sums.shape[1])], axis=1)
+
+    count, area = totals[:, 0], totals[:, 1]
+    # Elements of zero area count towards the cell but carry no weight
+    weight = np.where(area > 0, area, np.nan)
+    x, y, speed, depth = (totals[:, i] / weight for i in range(2, 6))
+    centres = shapely.points(origin[0] + (cells % n_cols + 0.5) * cell_size,
+                             origin[1] + (cells // n_cols + 0.5) * cell_size)
+    table = pa.table({
+        "ELEMENTS": count.astype(np.int64),
+        "AREA2D": area,
+        "DEPTH2D": depth,
+        "SPEED2D": speed,
+        "MAXANGLE2D": np.mod(np.arctan2(y, x), 2 * np.pi),
+        "X": x,
+        "Y": y,
+        geometry_name: pa.array(shapely.to_wkb(centres), type=pa.binary()),
+    })
+    with PartitionWriter(output_path, geometry_name, "Point", info["crs"]) as writer:
+        writer.write(table)
+    return writer.count
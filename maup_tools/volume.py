@@ -0,0 +1,199 @@
+import math
+import warnings
+from functools import partial
+
+import numpy as np
+import pandas as pd
+from rasterio.features import geometry_mask
+from rasterio.windows import Window, transform as window_transform
+
+from .histogram import valid_values
+from .raster_io import open_raster, read_band, run_in_threads
+from .stats import add_counts
+
+
+def tile_windows(src, tile_size=2048):
+    """Split a raster into windows of about tile_size x tile_size cells, aligned to its blocks."""
+    block_h, block_w = src.block_shapes[0]
+    tile_w = min(src.width, max(block_w, tile_size // block_w * block_w))
+    tile_h = max(block_h, (tile_size * tile_size // tile_w) // block_h * block_h)
+    windows = []
+    for row_off in range(0, src.height, tile_h):
+        for col_off in range(0, src.width, tile_w):
+            windows.append(Window(col_off, row_off,
+                                  min(tile_w, src.width - col_off),
+                                  min(tile_h, src.height - row_off)))
+    return windows
+
+def bounds_to_cells(bounds, src):
+    """Return the (row_start, row_stop, col_start, col_stop) cells covering the bounds, clipped to the raster."""
+    minx, miny, maxx, maxy = bounds
+    inverse = ~src.transform
+    cols, rows = zip(*(inverse * (x, y) for x in (minx, maxx) for y in (miny, maxy)))
+    row_start = max(0, math.floor(min(rows)))
+    row_stop = min(src.height, math.ceil(max(rows)))
+    col_start = max(0, math.floor(min(cols)))
+    col_stop = min(src.width, math.ceil(max(cols)))
+    return row_start, row_stop, col_start, col_stop
+
+def _summarise(depths):
+    """Sum the depths and count the cells of one window; np.sum is pairwise within the window."""
+    return (np.sum(depths), depths.size, np.count_nonzero(depths > 0), np.count_nonzero(depths < 0))
+
+def _combine(partials, cell_area):
+    """Combine window partials into a volume summary.
+
+    fsum is exactly rounded, so the total does not depend on the window order.
+    """
+    total_volume = math.fsum(window_partial[0] for window_partial in partials) * cell_area
+    if math.isinf(total_volume):
+        warnings.warn("Overflow encountered during volume calculation.", RuntimeWarning, stacklevel=2)
+
+    positive_cells = sum(int(window_partial[2]) for window_partial in partials)
+    return {
+        "total_volume": total_volume,
+        "wet_area": positive_cells * cell_area,
+        "cell_area": cell_area,
+        "valid_cells": sum(int(window_partial[1]) for window_partial in partials),
+        "positive_cells": positive_cells,
+        "negative_cells": sum(int(window_partial[3]) for window_partial in partials),
+    }
+
+def _volume_partials(raster_path, windows):
+    """Summarise each window, using one dataset handle per thread."""
+    partials = []
+    with open_raster(raster_path) as src:
+        for window in windows:
+            depths = valid_values(read_band(src, window)).astype(np.float64)
+            partials.append(_summarise(depths))
+    return partials
+
+def _zone_partials(raster_path, tasks):
+    """Summarise each zone within each window, masking only the zone's part of the window."""
+    partials = []
+    with open_raster(raster_path) as src:
+        for window, zones in tasks:
+            block = read_band(src, window)
+            for zone_index, (row_start, row_stop, col_start, col_stop), geometry in zones:
+                # Limit the mask to where the window and the zone's bounding box overlap
+                r0, r1 = max(row_start, window.row_off), min(row_stop, window.row_off + window.height)
+                c0, c1 = max(col_start, window.col_off), min(col_stop, window.col_off + window.width)
+                if r0 >= r1 or c0 >= c1:
+                    continue
+                sub_window = Window(c0, r0, c1 - c0, r1 - r0)
+                inside = geometry_mask([geometry], out_shape=(r1 - r0, c1 - c0),
+                                       transform=window_transform(sub_window, src.transform), invert=True)
+                sub_block = block[r0 - window.row_off:r1 - window.row_off, c0 - window.col_off:c1 - window.col_off]
+                depths = valid_values(sub_block[inside]).astype(np.float64)
+                partials.append((zone_index, _summarise(depths)))
+    return partials
+
+def read_zones(zones_file, crs=None, zone_field=None):
+    """Read a polygon layer of storage areas, returning zone names and geometries in the raster CRS."""
+    import geopandas as gpd
+
+    gdf = gpd.read_file(zones_file)
+    if crs is not None and gdf.crs is not None and gdf.crs != crs:
+        gdf = gdf.to_crs(crs)
+    if zone_field:
+        if zone_field not in gdf.columns:
+            raise ValueError(f"The zones layer does not have a '{zone_field}' field.")
+        names = gdf[zone_field].astype(str).tolist()
+    else:
+        names = [f"Zone {i + 1}" for i in range(len(gdf))]
+    return names, list(gdf.geometry)
+
+def calculate_volume(geotiff_file, zones=None, zone_field=None, max_workers=None, tile_size=2048):
+    """Calculate the volume of a depth raster, reading tiled windows across a thread pool.
+
+    Returns a dictionary with the total volume, wet area (cells deeper than
+    zero), cell area and the counts of valid, positive and negative cells.
+    If a polygon layer of zones is given, returns a DataFrame with those
+    values per zone instead, computed in one pass over the windows that the
+    zones touch.
+    """
+    with open_raster(geotiff_file) as src:
+        # Get the cell area from the raster metadata
+        cell_area = abs(src.transform.a * src.transform.e)
+        windows = tile_windows(src, tile_size)
+
+        if zones is not None:
+            names, geometries = read_zones(zones, src.crs, zone_field)
+            zone_cells = [bounds_to_cells(geometry.bounds, src) if geometry is not None and not geometry.is_empty
+                          else (0, 0, 0, 0) for geometry in geometries]
+
+    if zones is None:
+        return _combine(run_in_threads(geotiff_file, _volume_partials, windows, max_workers), cell_area)
+
+    # Pair each window with the zones whose bounding box it overlaps, and skip the rest
+    tasks = []
+    for window in windows:
+        touching = [(i, cells, geometries[i]) for i, cells in enumerate(zone_cells)
+                    if cells[0] < window.row_off + window.height and cells[1] > window.row_off
+                    and cells[2] < window.col_off + window.width and cells[3] > window.col_off]
+        if touching:
+            tasks.append((window, touching))
+
+    by_zone = [[] for _ in names]
+    for zone_index, zone_partial in run_in_threads(geotiff_file, _zone_partials, tasks, max_workers):
+        by_zone[zone_index].append(zone_partial)
+
+    rows = [{"zone": name, **_combine(partials, cell_area)} for name, partials in zip(names, by_zone)]
+    return pd.DataFrame(rows).drop(columns="cell_area")
+
+def _level_partials(raster_path, windows, interval):
+    """Count the wet cells and sum their depths per depth bin of each window."""
+    partials = []
+    with open_raster(raster_path) as src:
+        for window in windows:
+            depths = valid_values(read_band(src, window)).astype(np.float64)
+            depths = depths[depths > 0]
+            if depths.size:
+                bins = (depths // interval).astype(np.int64)
+                partials.append((np.bincount(bins), np.bincount(bins, weights=depths), depths.max()))
+    return partials
+
+def stage_storage_curve(geotiff_file, interval=0.1, water_level=None, max_workers=None, tile_size=2048):
+    """Derive the stage-storage curve of a depth raster from one pass over its tiled windows.
+
+    Wet cells are counted and their depths summed per depth bin of the given
+    interval. Lowering the water surface by s leaves a volume of
+    sum(d - s) over the cells deeper than s, which the cumulative counts and
+    sums give exactly at every bin edge. Returns a DataFrame of volume and
+    wetted area against the depth above the deepest cell, and against
+    elevation when the water level of the raster is given.
+    """
+    if interval <= 0:
+        raise ValueError("The level interval must be greater than zero.")
+
+    with open_raster(geotiff_file) as src:
+        cell_area = abs(src.transform.a * src.transform.e)
+        windows = tile_windows(src, tile_size)
+
+    counts = np.zeros(0, dtype=np.int64)
+    sums = np.zeros(0, dtype=np.float64)
+    max_depth = 0.0
+    for window_counts, window_sums, window_max in run_in_threads(
+            geotiff_file, partial(_level_partials, interval=interval), windows, max_workers):
+        counts = add_counts(counts, window_counts)
+        sums = add_counts(sums, window_sums)
+        max_depth = max(max_depth, float(window_max))
+
+    # Cells deeper than each bin edge below the deepest cell, and the sum of their depths
+    cells_below = np.cumsum(counts[::-1])[::-1]
+    depth_sums = np.cumsum(sums[::-1])[::-1]
+    drawdowns = np.arange(len(counts)) * interval
+    above_bed = drawdowns < max_depth
+    cells_below, depth_sums, drawdowns = cells_below[above_bed], depth_sums[above_bed], drawdowns[above_bed]
+
+    # Stage measured up from the deepest cell, ending with an empty reservoir
+    depths = np.append(max_depth - drawdowns, 0.0)
+    volumes = np.append((depth_sums - drawdowns * cells_below) * cell_area, 0.0)
+    areas = np.append(cells_below * cell_area, 0.0)
+
+    data = {'Depth (m)': depths}
+    if water_level is not None:
+        data['Elevation (mOD)'] = water_level - max_depth + depths
+    data['Volume (m³)'] = volumes
+    data['Area (m²)'] = areas
+    return pd.DataFrame(data).iloc[::-1].reset_index(drop=True)
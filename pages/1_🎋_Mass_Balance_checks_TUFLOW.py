@@ -1,7 +1,16 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
 import os
+from pandas.errors import ParserError
+from maup_tools.plotting import downsample
+from maup_tools.tail import MassBalanceTail
+from maup_tools.tuflow import bulk_mass_balance, cached_read, read_mass_balance, summarise_mass_balance
+from maup_tools.ui import show_chart
+
+try:
+    from pyarrow import ArrowInvalid
+except ImportError:
+    # Without pyarrow the CSV files are parsed by pandas, which raises ParserError
+    ArrowInvalid = ParserError
 
 #st.logo("images/logo.png", icon_image="images/logo.png")
 
@@ -26,48 +35,113 @@ st.sidebar.info(
 # Title of the application
 st.title("Mass Balance check from TUFLOW output")
 
+def draw_mass_balance(fig, df):
+    # Create the axes of the figure
+    ax1 = fig.subplots()
+
+    # Plot "Time (h)" vs "dVol" on the primary y-axis
+    ax1.set_xlabel('Time (hours)')
+    ax1.set_ylabel('Change in Volume (m³)')
+    # Long runs are downsampled to a fixed number of points, keeping every peak
+    line1, = ax1.plot(*downsample(df['Time (h)'], df['dVol']), color='tab:blue', label='dVol')
+    ax1.tick_params(axis='y')
+
+    # Create a secondary y-axis for "Cum ME (%)"
+    ax2 = ax1.twinx()
+    ax2.set_ylabel('Cumulative Mass Error (%)')
+    line2, = ax2.plot(*downsample(df['Time (h)'], df['Cum ME (%)']), color='tab:orange', label='Cum ME (%)')
+    ax2.tick_params(axis='y')
+
+    # Add horizontal grid lines to the secondary y-axis
+    ax2.grid(axis='y')
+
+    # Add legends
+    lines = [line1, line2]
+    labels = [line.get_label() for line in lines]
+    ax1.legend(lines, labels, loc='upper center', bbox_to_anchor=(0.5, -0.125), ncol=2)
+
+def plot_mass_balance(df, name, cached=True):
+    # Display the name of the uploaded file
+    st.write(f"File: {name}")
+
+    # Display the plot, reusing the rendered chart when the same data was plotted before
+    show_chart(draw_mass_balance, df, cached=cached)
+
+def watch_runs(paths, threshold):
+    """Read the lines appended to each MB.csv file since the last refresh, and plot every run."""
+    tails = st.session_state.setdefault("mb_tails", {})
+    for path in paths:
+        # Keep one tail per file, so each refresh parses only the new rows
+        if path not in tails:
+            tails[path] = MassBalanceTail(path)
+        try:
+            tails[path].poll()
+        except (OSError, ValueError) as e:
+            st.error(f"File {path} could not be read: {e}.")
+            continue
+
+        df = tails[path].data()
+        if df.empty:
+            st.write(f"File: {os.path.basename(path)} (waiting for data)")
+            continue
+        summary = summarise_mass_balance(df, threshold)
+        st.write(f"Latest time: {df['Time (h)'].iloc[-1]:.3f} h, "
+                 f"final Cum ME: {summary['Final Cum ME (%)']:.3f}%, "
+                 f"peak |Cum ME|: {summary['Peak |Cum ME| (%)']:.3f}% "
+                 f"({'pass' if summary['Pass'] else 'fail'})")
+        # The data grows on every refresh, so hashing it for the chart cache would cost a pass over every row
+        plot_mass_balance(df, os.path.basename(path), cached=False)
+
+watch_mode = st.checkbox("Watch mode: follow the MB.csv files of runs still in progress on this server")
+
+if watch_mode:
+    paths_text = st.text_area("Paths of the MB.csv files to watch (one per line):")
+    paths = [path.strip() for path in paths_text.splitlines() if path.strip()]
+    threshold = st.number_input("Cumulative mass error threshold (%):", min_value=0.0, value=1.0, step=0.1, format="%.2f")
+    interval = st.number_input("Refresh interval (seconds):", min_value=1, value=10, step=1)
+
+    if paths:
+        # Only this part of the page reruns on each refresh
+        st.experimental_fragment(watch_runs, run_every=interval)(paths, threshold)
+    else:
+        st.warning("Please enter at least one path.")
+    st.stop()
+
 # File uploader widget
 uploaded_files = st.file_uploader("Choose MB.csv file:", accept_multiple_files=True, type="csv")
 
-if uploaded_files:
+bulk_mode = st.checkbox("Bulk mode: show a summary table first, and plot only failing or selected runs")
+
+if uploaded_files and bulk_mode:
+    threshold = st.number_input("Cumulative mass error threshold (%):", min_value=0.0, value=1.0, step=0.1, format="%.2f")
+
+    # Parse only the required columns of every file concurrently
+    summary, frames, errors = bulk_mass_balance(uploaded_files, threshold)
+    for name, error in errors.items():
+        st.error(f"File {name} could not be read: {error}.")
+
+    st.subheader("Summary:")
+    st.write(f"{int(summary['Pass'].sum())} of {len(summary)} runs pass the threshold of {threshold:.2f}%.")
+    st.dataframe(summary, hide_index=True)
+
+    # Plot the failing runs, and any others the user picks
+    failing = summary.loc[~summary['Pass'], 'File'].tolist()
+    selected = st.multiselect("Runs to plot:", summary['File'].tolist(), default=failing)
+    for name in selected:
+        plot_mass_balance(frames[name], name)
+elif uploaded_files:
     for uploaded_file in uploaded_files:
-        # Read the CSV file into a DataFrame
-        df = pd.read_csv(uploaded_file)
-        
-        # Strip whitespace from column names
-        df.columns = df.columns.str.strip()
-
-        # Ensure the necessary columns are present
-        if 'Time (h)' in df.columns and 'dVol' in df.columns and 'Cum ME (%)' in df.columns:
-            # Display the name of the uploaded file
-            st.write(f"File: {uploaded_file.name}")
-
-            # Create a new figure and axes
-            fig, ax1 = plt.subplots()
-
-            # Plot "Time (h)" vs "dVol" on the primary y-axis
-            ax1.set_xlabel('Time (hours)')
-            ax1.set_ylabel('Change in Volume (m³)')
-            line1, = ax1.plot(df['Time (h)'], df['dVol'], color='tab:blue', label='dVol')
-            ax1.tick_params(axis='y')
-
-            # Create a secondary y-axis for "Cum ME (%)"
-            ax2 = ax1.twinx()
-            ax2.set_ylabel('Cumulative Mass Error (%)')
-            line2, = ax2.plot(df['Time (h)'], df['Cum ME (%)'], color='tab:orange', label='Cum ME (%)')
-            ax2.tick_params(axis='y')
-
-            # Add horizontal grid lines to the secondary y-axis
-            ax2.grid(axis='y')
-
-            # Add legends
-            lines = [line1, line2]
-            labels = [line.get_label() for line in lines]
-            ax1.legend(lines, labels, loc='upper center', bbox_to_anchor=(0.5, -0.125), ncol=2)
-
-            # Display the plot
-            st.pyplot(fig)
-        else:
+        # Read the required columns of the CSV file into a DataFrame, reusing the parse of an earlier rerun
+        try:
+            df = cached_read(uploaded_file, read_mass_balance)
+        except (ArrowInvalid, ParserError) as e:
+            # Both are ValueErrors, so they are caught before the missing columns
+            st.error(f"File {uploaded_file.name} could not be parsed: {e}")
+            continue
+        except ValueError:
             st.error(f"File {uploaded_file.name} does not have the required columns 'Time (h)', 'dVol', and 'Cum ME (%)'.")
+            continue
+
+        plot_mass_balance(df, uploaded_file.name)
 else:
     st.warning("Please upload at least one CSV file.")
@@ -1,7 +1,9 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
 import os
+from maup_tools.plotting import downsample
+from maup_tools.tail import CourantTail
+from maup_tools.tuflow import bulk_courant, courant_events
+from maup_tools.ui import show_chart
 
 #st.logo("images/logo.png", icon_image="images/logo.png")
 
@@ -31,6 +33,7 @@ st.markdown(
         - An Nu value of 1.0 or greater may indicate that the velocity is unusually high  
         - An Nc value of 1.0 or higher could be caused by an erroneously low cell elevation, resulting in an artificially large water depth  
         - An Nd value of 0.3 or higher might suggest that there is poor boundary setup, or insufficient SX cells linked to a 1D structure  
+    Every period where Nu, Nc or Nd is at or above its threshold is listed as an exceedance event, so that many runs can be checked from one table.  
 
     """
 )
@@ -42,39 +45,92 @@ st.markdown(
     """
 )
 
+def draw_courant(fig, df, name):
+    # Plot dtStar_cumsum on x-axis, and Nu, Nc, and Nd on y-axis
+    fig.set_size_inches(10, 5)
+    ax = fig.subplots()
+    # Long runs are downsampled to a fixed number of points, keeping every spike above the thresholds
+    ax.plot(*downsample(df['dtStar_cumsum'], df['Nu']), label='Nu')
+    ax.plot(*downsample(df['dtStar_cumsum'], df['Nc']), label='Nc')
+    ax.plot(*downsample(df['dtStar_cumsum'], df['Nd']), label='Nd')
+
+    # Add horizontal lines
+    ax.axhline(y=0.3, color='r', linestyle='--')
+    ax.axhline(y=1, color='g', linestyle='-.')
+
+    # Add labels and legend
+    ax.set_xlabel('Time (hours)')
+    ax.set_ylabel('Nu, Nc, Nd')
+    ax.legend(bbox_to_anchor=(0.5, -0.25), loc='lower center', ncol=3)
+    ax.set_title(f"Plot for {name}")
+
+def plot_courant(df, name, cached=True):
+    # Display the name of the file
+    st.write(f"File: {name}")
+
+    # Display the plot, reusing the rendered chart when the same data was plotted before
+    show_chart(draw_courant, df, name, cached=cached)
+
+def watch_runs(paths):
+    """Read the lines appended to each HPC.dt.csv file since the last refresh, and plot every run."""
+    tails = st.session_state.setdefault("courant_tails", {})
+    for path in paths:
+        # Keep one tail per file, so each refresh parses only the new rows
+        if path not in tails:
+            tails[path] = CourantTail(path)
+        try:
+            tails[path].poll()
+        except (OSError, ValueError) as e:
+            st.error(f"File {path} could not be read: {e}.")
+            continue
+
+        df = tails[path].data()
+        if df.empty:
+            st.write(f"File: {os.path.basename(path)} (waiting for data)")
+            continue
+        events = courant_events(df)
+        st.write(f"Latest time: {df['dtStar_cumsum'].iloc[-1]:.3f} h, exceedance events so far: {len(events)}")
+        # The data grows on every refresh, so hashing it for the chart cache would cost a pass over every row
+        plot_courant(df, os.path.basename(path), cached=False)
+
+watch_mode = st.checkbox("Watch mode: follow the HPC.dt.csv files of runs still in progress on this server")
+
+if watch_mode:
+    paths_text = st.text_area("Paths of the HPC.dt.csv files to watch (one per line):")
+    paths = [path.strip() for path in paths_text.splitlines() if path.strip()]
+    interval = st.number_input("Refresh interval (seconds):", min_value=1, value=10, step=1)
+
+    if paths:
+        # Only this part of the page reruns on each refresh
+        st.experimental_fragment(watch_runs, run_every=interval)(paths)
+    else:
+        st.warning("Please enter at least one path.")
+    st.stop()
+
 # File uploader widget
 uploaded_files = st.file_uploader("Choose a HPC.dt.csv file:", accept_multiple_files=True, type="csv")
 
 if uploaded_files:
-    for uploaded_file in uploaded_files:
-        # Read the uploaded CSV file into a DataFrame
-        df = pd.read_csv(uploaded_file)
-
-        # Display the dataframe
-        st.write(f"File: {uploaded_file.name}")
-        
-        # Perform the calculations
-        df['dtStar_divided'] = df['dtStar'] / 3600
-        df['dtStar_cumsum'] = df['dtStar_divided'].cumsum()
-
-        # Plot dtStar_cumsum on x-axis, and Nu, Nc, and Nd on y-axis
-        plt.figure(figsize=(10, 5))
-        plt.plot(df['dtStar_cumsum'], df['Nu'], label='Nu')
-        plt.plot(df['dtStar_cumsum'], df['Nc'], label='Nc')
-        plt.plot(df['dtStar_cumsum'], df['Nd'], label='Nd')
-
-        # Add horizontal lines
-        plt.axhline(y=0.3, color='r', linestyle='--')
-        plt.axhline(y=1, color='g', linestyle='-.')
-
-        # Add labels and legend
-        plt.xlabel('Time (hours)')
-        plt.ylabel('Nu, Nc, Nd')
-        plt.legend(bbox_to_anchor=(0.5, -0.25), loc='lower center', ncol=3)
-        plt.title(f"Plot for {uploaded_file.name}")
-
-        # Display the plot
-        st.pyplot(plt)
+    # Parse only the required columns of every file concurrently, and find the exceedance events
+    summary, events, frames, errors = bulk_courant(uploaded_files)
+    for name, error in errors.items():
+        st.error(f"File {name} could not be read: {error}.")
+
+    # Display the cross-file summary and every exceedance event
+    st.subheader("Summary:")
+    st.write(f"{int(summary['Pass'].sum())} of {len(summary)} runs have no values at or above the thresholds.")
+    st.dataframe(summary, hide_index=True)
+    st.subheader("Exceedance events:")
+    if events.empty:
+        st.write("No exceedance events.")
+    else:
+        st.dataframe(events, hide_index=True)
+
+    show_charts = st.checkbox("Plot charts", value=len(frames) <= 10)
+    selected = st.multiselect("Runs to plot:", list(frames), default=list(frames)) if show_charts else []
+
+    for name in selected:
+        plot_courant(frames[name], name)
 
 else:
     st.warning("Please upload at least one CSV file.")
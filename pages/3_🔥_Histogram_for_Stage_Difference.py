@@ -1,10 +1,12 @@
 import streamlit as st
-import rasterio
-import numpy as np
 import seaborn as sns
-import matplotlib.pyplot as plt
+import os
 import pandas as pd
-import tempfile
+from maup_tools.histogram import batch_histogram_percentages, check_bin_edges, find_rasters, generate_bin_labels
+from maup_tools.quicklook import draw_quicklook, read_quicklook
+from maup_tools.raster_io import cached_raster_result, file_identity, results
+from maup_tools.stats import summarise_raster
+from maup_tools.ui import gdal_settings_panel, raster_diagnostics_panel, show_chart
 
 #st.logo("images/logo.png", icon_image="images/logo.png")
 
@@ -25,65 +27,101 @@ st.sidebar.info(
     """
 )
 
+gdal_settings_panel()
+
 # Title of the application
 st.title("Generate histogram from stage difference rasters")
 
-def generate_bin_labels(bin_edges):
-    """Generate bin labels based on bin edges."""
-    bin_labels = []
-    for i in range(len(bin_edges) - 1):
-        if i == 0:
-            bin_labels.append(f'< {bin_edges[i+1]}')
-        elif i == len(bin_edges) - 2:
-            bin_labels.append(f'> {bin_edges[i]}')
-        else:
-            bin_labels.append(f'{bin_edges[i]} to {bin_edges[i+1]}')
-    return bin_labels
-
-def create_histogram_with_labels(raster_path, bin_edges):
-    # Generate bin labels from bin edges
-    bin_labels = generate_bin_labels(bin_edges)
-    
-    # Open the raster file
-    with rasterio.open(raster_path) as src:
-        data = src.read(1)
-    
-    # Mask the nodata values
-    data = np.ma.masked_equal(data, src.nodata)
-    
-    # Flatten the data and remove masked elements
-    data = data.compressed()
-
-    # Create a DataFrame to hold the data and categories
-    df = pd.DataFrame(data, columns=['value'])
-    
-    # Categorize the data into the custom bins
-    df['category'] = pd.cut(df['value'], bins=bin_edges, labels=bin_labels, include_lowest=True)
-    
-    # Calculate total number of data points
-    n_total = len(df)
-    
-    # Calculate frequencies as percentages
-    bin_counts = df['category'].value_counts().reindex(bin_labels)
-    bin_percentages = (bin_counts / n_total) * 100
-    
-    # Plot the histogram using seaborn
-    fig, ax = plt.subplots()
-    sns.histplot(df['category'], bins=bin_edges, discrete=True, stat='percent', ax=ax)
-    plt.xlabel('Difference in Peak Stage (m)')
-    plt.ylabel('Percentage Occurrence')
-    plt.xticks(rotation=90)  # Rotate x-axis labels for better readability
-    plt.ylim(0, 105)  # Set y-axis limits to range up to 100
+def draw_histogram(fig, bin_labels, bin_percentages):
+    # Plot the histogram from the bin percentages
+    ax = fig.subplots()
+    sns.barplot(x=bin_labels, y=bin_percentages, ax=ax)
+    ax.set_xlabel('Difference in Peak Stage (m)')
+    ax.set_ylabel('Percentage Occurrence')
+    ax.tick_params(axis='x', labelrotation=90)  # Rotate x-axis labels for better readability
+    ax.set_ylim(0, 105)  # Set y-axis limits to range up to 100
     
     # Annotate values above bars
-    for i, (rect, percentage) in enumerate(zip(ax.patches, bin_percentages)):
+    for rect, percentage in zip(ax.patches, bin_percentages):
         height = rect.get_height()
         ax.text(rect.get_x() + rect.get_width() / 2, height + 0.005, f'{percentage:.2f}%', 
                 ha='center', va='bottom')
 
-    st.pyplot(fig)
+def create_histogram_with_labels(raster, bin_edges, thresholds=()):
+    # Generate bin labels from bin edges
+    bin_labels = generate_bin_labels(bin_edges)
+    
+    # Count the cells in each bin and collect the statistics in one block-wise pass, reusing them on reruns
+    summary = cached_raster_result(raster, summarise_raster, tuple(bin_edges), tuple(thresholds))
+    if summary.n_total == 0:
+        st.warning("The raster has no valid cells.")
+        return
+    
+    # Display the plot of the bin percentages, reusing the rendered chart when the same histogram was plotted before
+    show_chart(draw_histogram, bin_labels, summary.bin_percentages)
+
+    # Display the summary statistics and the area above each threshold
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Statistics:")
+        stats = pd.DataFrame(summary.statistics().items(), columns=["Statistic", "Value (m)"])
+        st.dataframe(stats, hide_index=True)
+    with col2:
+        st.subheader("Area above thresholds:")
+        areas = pd.DataFrame(summary.exceedance_areas().items(), columns=["Threshold (m)", "Area (square units)"])
+        st.dataframe(areas, hide_index=True)
+    st.caption("Percentiles are estimated from a streaming sketch, within 0.5% of the true value.")
+
+def draw_batch_comparison(fig, df, bin_labels, chart_type):
+    if chart_type == "Grouped":
+        # One group of bars per bin, one bar per scenario
+        long_df = df.melt(id_vars="Scenario", value_vars=bin_labels, var_name="Bin", value_name="Percentage")
+        fig.set_size_inches(10, 5)
+        ax = fig.subplots()
+        sns.barplot(data=long_df, x="Bin", y="Percentage", hue="Scenario", ax=ax)
+        ax.set_xlabel('Difference in Peak Stage (m)')
+        ax.set_ylabel('Percentage Occurrence')
+        ax.tick_params(axis='x', labelrotation=90)
+        ax.set_ylim(0, 105)
+        ax.legend(bbox_to_anchor=(1.02, 1), loc='upper left')
+    else:
+        # One bar per scenario, stacked by bin up to 100%
+        fig.set_size_inches(10, max(3, 0.4 * len(df)))
+        ax = fig.subplots()
+        df.set_index("Scenario")[bin_labels].plot.barh(stacked=True, ax=ax)
+        ax.set_xlabel('Percentage Occurrence')
+        ax.set_xlim(0, 100)
+        ax.invert_yaxis()
+        ax.legend(title='Difference in Peak Stage (m)', bbox_to_anchor=(1.02, 1), loc='upper left')
+
+def create_batch_comparison(raster_paths, bin_edges, chart_type):
+    bin_labels = generate_bin_labels(bin_edges)
+
+    # Bin all the rasters in parallel, reusing the table until any of the files change
+    key = ("batch histogram", tuple(file_identity(path) for path in raster_paths), tuple(bin_edges))
+    df = results.get_or_compute(key, lambda: batch_histogram_percentages(raster_paths, bin_edges))
+
+    st.subheader("Percentage occurrence per scenario:")
+    st.dataframe(df, hide_index=True)
+    st.download_button(
+        label="Download CSV",
+        data=df.to_csv(index=False),
+        file_name="stage_difference_histograms.csv",
+        mime="text/csv"
+    )
+
+    show_chart(draw_batch_comparison, df, bin_labels, chart_type)
+
+mode = st.radio("Select mode:", ["Single raster", "Batch comparison"], horizontal=True)
+
+if mode == "Single raster":
+    uploaded_file = st.file_uploader("Upload a stage difference raster file (ASCII or GeoTIFF):", type=["asc", "tif", "tiff"])
+    raster_path = st.text_input("Or, for very large rasters, enter the path of the raster file on the server:", value="")
+    thresholds_input = st.text_input("Enter thresholds for the area above, separated by commas:", "0.01, 0.05, 0.1")
+else:
+    batch_input = st.text_area("Enter a folder containing the stage difference rasters, or the paths of the rasters one per line:", value="")
+    chart_type = st.radio("Select chart type:", ["Grouped", "Stacked"], horizontal=True)
 
-uploaded_file = st.file_uploader("Upload a stage difference raster file (ASCII or GeoTIFF):", type=["asc", "tif", "tiff"])
 bin_edges_input = st.text_input("Enter bin edges separated by commas:", "-100, -0.1, -0.05, -0.01, 0.01, 0.05, 0.1, 100")
 
 # Convert input bin edges to a list of floats
@@ -93,13 +131,57 @@ except ValueError:
     st.error("Please enter valid bin edges separated by commas.")
     st.stop()
 
+try:
+    check_bin_edges(bin_edges)
+except ValueError as e:
+    st.error(str(e))
+    st.stop()
+
+if mode == "Batch comparison":
+    # Expand a folder to the rasters inside it
+    entries = [line.strip().strip('"') for line in batch_input.splitlines() if line.strip()]
+    if len(entries) == 1 and os.path.isdir(entries[0]):
+        raster_paths = find_rasters(entries[0])
+    else:
+        raster_paths = entries
+
+    missing = [path for path in raster_paths if not os.path.isfile(path)]
+    if not raster_paths:
+        st.warning("Please enter a folder or the paths of the raster files.")
+    elif missing:
+        st.error(f"The following files do not exist: {', '.join(missing)}")
+    elif st.button("Generate Batch Comparison"):
+        create_batch_comparison(raster_paths, bin_edges, chart_type)
+    raster_diagnostics_panel()
+    st.stop()
+
+# Convert input thresholds to a list of floats
+try:
+    thresholds = [float(t) for t in thresholds_input.split(',') if t.strip()]
+except ValueError:
+    st.error("Please enter valid thresholds separated by commas.")
+    st.stop()
+
+# Uploads are read from memory; a server-side path is read in place
 if uploaded_file is not None:
-    # Save the uploaded file to a temporary location
-    with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-        tmp_file.write(uploaded_file.read())
-        tmp_raster_path = tmp_file.name
-    
-    if st.button("Generate Histogram"):
-        create_histogram_with_labels(tmp_raster_path, bin_edges)
+    raster = uploaded_file
+elif raster_path:
+    raster = raster_path.strip('"')
+    if not os.path.isfile(raster):
+        st.error(f"The file {raster} does not exist.")
+        st.stop()
 else:
     st.warning("Please upload a raster file.")
+    st.stop()
+
+if st.button("Generate Histogram"):
+    create_histogram_with_labels(raster, bin_edges, thresholds)
+
+if st.checkbox("Show quicklook map"):
+    # Decimated read within a fixed pixel budget, coloured with the histogram bins
+    data, bounds, has_overviews = cached_raster_result(raster, read_quicklook)
+    if not has_overviews:
+        st.info("The raster has no overviews, so the quicklook is resampled from the full resolution data.")
+    show_chart(draw_quicklook, data, bounds, bin_edges=bin_edges, label='Difference in Peak Stage (m)')
+
+raster_diagnostics_panel(raster)
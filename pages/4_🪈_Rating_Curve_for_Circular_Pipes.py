@@ -1,9 +1,7 @@
 import streamlit as st
-import math
-import numpy as np
-import matplotlib.pyplot as plt
-import pandas as pd
 import os
+from maup_tools.rating import generate_rating_curve
+from maup_tools.ui import show_chart
 
 #st.logo("images/logo.png", icon_image="images/logo.png")
 
@@ -33,59 +31,18 @@ st.write("""
     The tool has the facility to save this rating curve to the folder location of your interest as a CSV; scroll down after you've generated the rating curve.  
     """)
 
-def partial_flow_area(diameter, depth):
-    """Calculate the cross-sectional area of flow in a partially full circular pipe."""
-    if depth <= 0:
-        return 0
-    if depth >= diameter:
-        return (math.pi * diameter**2) / 4
-    theta = 2 * math.acos((diameter - 2 * depth) / diameter)
-    area = (diameter**2 / 8) * (theta - math.sin(theta))
-    return area
-
-def partial_flow_hydraulic_radius(diameter, depth):
-    """Calculate the hydraulic radius of flow in a partially full circular pipe."""
-    if depth <= 0:
-        return 0
-    if depth >= diameter:
-        return diameter / 4
-    theta = 2 * math.acos((diameter - 2 * depth) / diameter)
-    wetted_perimeter = diameter * theta / 2
-    area = partial_flow_area(diameter, depth)
-    return area / wetted_perimeter
-
-def flow_rate(diameter, slope, manning_n, depth):
-    """Calculate the flow rate for a given depth in a circular pipe using Manning's equation."""
-    area = partial_flow_area(diameter, depth)
-    hydraulic_radius = partial_flow_hydraulic_radius(diameter, depth)
-    if hydraulic_radius == 0:
-        return 0
-    flow_rate = (1 / manning_n) * area * (hydraulic_radius**(2/3)) * (slope**0.5)
-    return flow_rate
-
-def generate_rating_curve(diameter, slope, manning_n, invert_level, num_points=100):
-    """Generate a rating curve for a circular pipe."""
-    depths = np.linspace(0, diameter, num_points)
-    elevations = invert_level + depths
-    flow_rates = [flow_rate(diameter, slope, manning_n, depth) for depth in depths]
-
-    # Create a DataFrame
-    data = {
-        # 'Depth (m)': depths,
-        'Elevation (mOD)': elevations,
-        'Flow (m³/s)': flow_rates
-    }
-    df = pd.DataFrame(data)
-
-    return df
+def draw_rating_curve(fig, df):
+    ax = fig.subplots()
+    ax.plot(df['Flow (m³/s)'], df['Elevation (mOD)'])
+    ax.set_ylabel("Elevation (mOD)")
+    ax.set_xlabel("Flow (m³/s)")
+    ax.grid(True)
 
 # Initialize session state
 if 'df' not in st.session_state:
     st.session_state.df = None
 if 'curve_generated' not in st.session_state:
     st.session_state.curve_generated = False
-if 'plot' not in st.session_state:
-    st.session_state.plot = None
     
 # Input parameters
 diameter = st.number_input("Diameter (m):", min_value=0.0, value=1.0, step=0.1, format="%.1f")
@@ -100,21 +57,13 @@ if st.button("Generate Rating Curve"):
         st.session_state.df = generate_rating_curve(diameter, slope, manning_n, invert_level)
         st.session_state.curve_generated = True
         
-        # Plot the rating curve
-        fig, ax = plt.subplots()
-        ax.plot(st.session_state.df['Flow (m³/s)'], st.session_state.df['Elevation (mOD)'])
-        ax.set_ylabel("Elevation (mOD)")
-        ax.set_xlabel("Flow (m³/s)")
-        ax.grid(True)
-        st.session_state.plot = fig
-        
     except Exception as e:
         st.error(f"An error occurred: {str(e)}")
         st.session_state.curve_generated = False
 
-# Display plot if it exists
-if st.session_state.plot is not None:
-    st.pyplot(st.session_state.plot)
+# Plot the rating curve if it exists; only the rendered chart is kept, in a shared bounded cache
+if st.session_state.curve_generated:
+    show_chart(draw_rating_curve, st.session_state.df)
     
 # File path input and save button (outside the main if-block)
 if st.session_state.curve_generated:
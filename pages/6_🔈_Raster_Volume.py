@@ -1,6 +1,9 @@
 import streamlit as st
-import rasterio
-import numpy as np
+import os
+from maup_tools.quicklook import draw_quicklook, read_quicklook
+from maup_tools.raster_io import cached_raster_result, layer_identity
+from maup_tools.ui import gdal_settings_panel, raster_diagnostics_panel, show_chart
+from maup_tools.volume import calculate_volume, stage_storage_curve
 
 #st.logo("images/logo.png", icon_image="images/logo.png")
 
@@ -21,54 +24,129 @@ st.sidebar.info(
     """
 )
 
+gdal_settings_panel()
+
 # Title of the application
 st.title("Calculate Volume of a Depth Raster")
 
 st.markdown("""
     This tool uses the depth values and cell size from a raster to calculate the total volume.  
     Negative values will reduce the total volume.  
-    No data values are ignored. 
+    No data values are ignored.  
+    The wet area is the area of the cells with a depth greater than zero.  
     """)
     
 st.markdown("""
-    This tool should particularly be used after you've clipped the depth raster behind the reservoir/bund in QGIS 3.x or ArcMap.  
+    This tool should particularly be used for the depth raster behind the reservoir/bund.  
+    Instead of clipping the raster in QGIS 3.x or ArcMap, you can mention a polygon layer (Shapefile or GeoPackage) of the storage areas, and the volume is calculated for every polygon.  
+    Please remove the double quotations if you're copying and pasting the polygon layer as 'Copy as path'.  
     """)
 
-def calculate_volume(geotiff_file):
-    with rasterio.open(geotiff_file) as src:
-        # Read the depth values from the raster
-        depths = src.read(1, masked=True).astype(np.float64)  # Ensure using a data type with large range
+uploaded_file = st.file_uploader("Upload a raster file (ASCII or GeoTIFF):", type=["asc", "tif", "tiff"])
+raster_path = st.text_input("Or, for very large rasters, enter the path of the raster file on the server:", value="")
+zones_path = st.text_input("Optional: enter the path of a polygon layer of storage areas:", value="")
+zone_field = st.text_input("Optional: enter the attribute that names the storage areas:", value="")
 
-        # Get the cell size from the raster metadata
-        cell_size_x = src.transform[0]
-        cell_size_y = -src.transform[4]
-       
-        # Calculate volume per cell
-        with np.errstate(over='ignore'):  # Ignore overflow warnings
-            volumes = depths * cell_size_x * cell_size_y
+# Uploads are read from memory; a server-side path is read in place
+if uploaded_file is not None:
+    raster = uploaded_file
+elif raster_path:
+    raster = raster_path.strip('"')
+    if not os.path.isfile(raster):
+        st.error(f"The file {raster} does not exist.")
+        st.stop()
+else:
+    st.warning("Please upload a raster file.")
+    st.stop()
 
-        # Check for any infinities resulted from overflow
-        if np.isinf(volumes).any():
-            print("Warning: Overflow encountered during volume calculation.")
+if zones_path:
+    # Calculate the volume of every storage area in one pass over the raster
+    try:
+        zones_path = zones_path.strip('"')
+        zone_volumes = cached_raster_result(raster, calculate_volume, zones_path, zone_field or None,
+                                            extra_key=layer_identity(zones_path))
+        st.subheader("Volume per storage area:")
+        st.dataframe(zone_volumes, hide_index=True)
+        st.download_button(
+            label="Download CSV",
+            data=zone_volumes.to_csv(index=False),
+            file_name="zone_volumes.csv",
+            mime="text/csv"
+        )
+    except Exception as e:
+        st.error(f"Error calculating the volume of the storage areas: {str(e)}")
+else:
+    # Calculate the volume, reusing the result on reruns
+    result = cached_raster_result(raster, calculate_volume)
 
-        # Calculate total volume
-        total_volume = np.nansum(volumes)  # Use nansum to handle masked elements
+    # Format the volume and area to display with three decimal places
+    formatted_volume = "{:.3f}".format(result["total_volume"])
+    formatted_area = "{:.3f}".format(result["wet_area"])
 
-        return total_volume
-        
-uploaded_file = st.file_uploader("Upload a raster file (ASCII or GeoTIFF):", type=["asc", "tif", "tiff"])
+    st.write("Total Volume:", formatted_volume, "cubic units")
+    # Cached results do not repeat the warning raised by the calculation
+    if result["total_volume"] in (float("inf"), float("-inf")):
+        st.warning("Overflow encountered during volume calculation.")
+    st.write("Wet Area:", formatted_area, "square units")
+    st.write("Cells with positive depth:", result["positive_cells"])
+    st.write("Cells with negative depth:", result["negative_cells"])
 
-if uploaded_file is not None:
-    # Save the uploaded file to a temporary location
-    with open("uploaded_file.tif", "wb") as f:
-        f.write(uploaded_file.getbuffer())
+st.subheader("Stage-Storage Curve")
+st.write("""
+    Generates the stored volume and wetted area against depth above the deepest cell from a single pass over the depth raster.  
+    Optionally, mention the water level of the depth raster to also report the curve against elevation.  
+    """)
 
-    # Calculate the volume
-    volume = calculate_volume("uploaded_file.tif")
+def draw_storage_curve(fig, df):
+    level_column = 'Elevation (mOD)' if 'Elevation (mOD)' in df.columns else 'Depth (m)'
+    ax = fig.subplots()
+    ax.plot(df['Volume (m³)'], df[level_column])
+    ax.set_ylabel(level_column)
+    ax.set_xlabel("Volume (m³)")
+    ax.grid(True)
 
-    # Format the volume to display with three decimal places
-    formatted_volume = "{:.3f}".format(volume)
+# Initialize session state
+if 'storage_df' not in st.session_state:
+    st.session_state.storage_df = None
 
-    st.write("Total Volume:", formatted_volume, "cubic units")
-else:
-    st.warning("Please upload a raster file.")
+level_interval = st.number_input("Level interval (m):", min_value=0.01, value=0.1, step=0.05, format="%.2f")
+water_level = st.number_input("Optional: water level of the depth raster (mOD):", value=None, format="%.3f")
+
+# Button to generate and plot the stage-storage curve
+if st.button("Generate Stage-Storage Curve"):
+    try:
+        st.session_state.storage_df = cached_raster_result(raster, stage_storage_curve, level_interval, water_level)
+
+    except Exception as e:
+        st.error(f"An error occurred: {str(e)}")
+        st.session_state.storage_df = None
+
+# Plot the stage-storage curve if it exists; only the rendered chart is kept, in a shared bounded cache
+if st.session_state.storage_df is not None:
+    show_chart(draw_storage_curve, st.session_state.storage_df)
+
+# File path input and save button
+if st.session_state.storage_df is not None:
+    file_path = st.text_input("Enter the full path and file name with extension for the CSV (e.g., C:\\Specify\\Your\\Path\\stage_storage.csv):", value="")
+    if st.button("Save to specified path"):
+        if file_path:
+            try:
+                # Ensure the directory exists
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+                # Save the DataFrame to the specified CSV file
+                st.session_state.storage_df.to_csv(file_path, index=False)
+                st.success(f"File saved successfully.")
+            except Exception as save_error:
+                st.error(f"Error saving file: {str(save_error)}")
+        else:
+            st.warning("Please enter a file path before saving.")
+
+if st.checkbox("Show quicklook map"):
+    # Decimated read within a fixed pixel budget
+    data, bounds, has_overviews = cached_raster_result(raster, read_quicklook)
+    if not has_overviews:
+        st.info("The raster has no overviews, so the quicklook is resampled from the full resolution data.")
+    show_chart(draw_quicklook, data, bounds, cmap='Blues', label='Depth')
+
+raster_diagnostics_panel(raster)
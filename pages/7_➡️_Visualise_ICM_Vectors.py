@@ -1,7 +1,6 @@
 import streamlit as st
-import dask_geopandas as dgpd
-import dask
 import os
+from maup_tools.vectors import grid_vectors, parse_area, process_shapefile
 
 #st.logo("images/logo.png", icon_image="images/logo.png")
 
@@ -27,34 +26,26 @@ st.title("Visualise ICM Vectors in GIS")
 
 st.markdown("""
     This tool converts InfoWorks ICM "2D Zones.shp" polygons to points, to visualise the output in any GIS software.  
+    The points can be saved as a Shapefile (.shp), GeoPackage (.gpkg), FlatGeobuf (.fgb) or GeoParquet (.parquet); use one of the last three for meshes over the 2 GB Shapefile limit.  
+    For large meshes, the elements can be aggregated onto a regular grid instead, giving one readable arrow per grid cell.  
     Please remove the double quotations if you're copying and pasting the shapefile as 'Copy as path'.  
     Optionally, there is a provision to download the QML file after the processing is complete to style the points shapefile in QGIS.  
         
     """)
 
-def process_shapefile(file_path, output_path): 
-    # Load the shapefile into a Dask GeoDataFrame
-    ddf = dgpd.read_file(file_path, npartitions=4)
-
-    # Filter out rows with zero DEPTH2D, i.e. remove rows of 0 depths
-    ddf = ddf[ddf['DEPTH2D'] != 0]
-
-    # Calculate centroids and create a new Dask GeoDataFrame
-    ddf_points = ddf.copy()
-    ddf_points['geometry'] = ddf.geometry.centroid
-
-    # Calculate X and Y components
-    ddf_points['X'] = ddf['SPEED2D'] * dask.array.cos(ddf['MAXANGLE2D'])
-    ddf_points['Y'] = ddf['SPEED2D'] * dask.array.sin(ddf['MAXANGLE2D'])
-
-    # Compute and save the Dask GeoDataFrame to a new shapefile
-    ddf_points.compute().to_file(output_path)
-
 # Provide an option to select a pre-uploaded file
 uploaded_file = st.text_input("Upload a Shapefile:", value="mention/the/path.shp")
 
 # Get output path from user
-output_path = st.text_input("Enter the output path including filename and .shp extension:")
+output_path = st.text_input("Enter the output path including filename and .shp, .gpkg, .fgb or .parquet extension:")
+
+# Choose between one point per element and one point per grid cell
+point_mode = st.radio("Points:", ["One per wet element", "Aggregated onto a grid"], horizontal=True)
+if point_mode == "Aggregated onto a grid":
+    cell_size = st.number_input("Grid cell size (m):", min_value=0.1, value=25.0, step=5.0)
+
+# Only the elements touching the area of interest are read, if one is given
+area_text = st.text_input("Optional: area of interest, as 'minx, miny, maxx, maxy' in the model's coordinates or the path of a polygon file:")
 
 if st.button("Process Shapefile"):
     if not uploaded_file or uploaded_file == "mention/the/path.shp":
@@ -67,8 +58,17 @@ if st.button("Process Shapefile"):
             if not output_path:
                 raise ValueError("Please specify an output path.")
 
-            process_shapefile(uploaded_file, output_path)
-            st.success(f"Processed shapefile is saved.")
+            area = parse_area(area_text)
+
+            # The mesh is converted in partitions across all cores, each written as soon as it is done
+            if point_mode == "Aggregated onto a grid":
+                n_points = grid_vectors(uploaded_file, output_path, cell_size, area)
+            else:
+                n_points = process_shapefile(uploaded_file, output_path, area)
+            if n_points:
+                st.success(f"Processed shapefile is saved with {n_points} points.")
+            else:
+                st.warning("No wet elements were found, so no points were saved.")
             
             # Add download button for QML file
             qml_path = "themes/Point_Vectors.qml"
@@ -1,5 +1,11 @@
 import streamlit as st
-import re
+import os
+import numpy as np
+import pandas as pd
+from maup_tools.icm_log import HEAD_BYTES, audit_logs, find_logs, progress_rates, read_log_info, read_log_trace, read_logs, slow_periods
+from maup_tools.plotting import downsample
+from maup_tools.raster_io import file_identity, results, source_digest
+from maup_tools.ui import show_chart
 
 #st.logo("images/logo.png", icon_image="images/logo.png")
 
@@ -28,147 +34,109 @@ st.markdown("""
     SIM ID can be identified by right-clicking the run 'Model Group', clicking 'Open results manager', and checking 'ID' attribute beside the run.  
         
     """)
-    
-# Function to extract values from the log file
-def extract_log_info(file_content):
-    gpu_used = False
-    volume_balance_error = None
-    elapsed_clock_time = None
-    network = None
-    network_scenario = None
-    inflow = None
-    level = None
-    rainfall_event = None
-    innovyze_version = None
-    event_details = None
-    start_time = None
-    requested_duration = None
-    min_element_area = None
-    max_element_area = None
-    boundary_condition = None
-    twod_zone_mass_error = None
-    timestep_value = None
-    
-    min_element_area_count = 0
-
-    # Read the file content line by line
-    lines = file_content.split('\n')
-
-    # Check for Innovyze Workgroup Client version first
-    for line in lines:
-        if "InfoWorks ICM SIM" in line:
-            match = re.search(r'InfoWorks ICM SIM\s*(.*)', line)
-            if match:
-                innovyze_version = match.group(1)
-
-    # Process each line to extract other information
-    for line in lines:
-        if "VBEP -> Volume balance error %" in line:
-            match = re.search(r'VBEP -> Volume balance error %\s*:\s*(-?\d+\.\d+)', line)
-            if match:
-                volume_balance_error = match.group(1)
-
-        if "Elapsed clock time" in line:
-            match = re.search(r'Elapsed clock time\s*=\s*(\d+s)', line)
-            if match:
-                elapsed_clock_time = match.group(1)
-
-        if "GPU used successfully" in line:
-            gpu_used = True
-
-        if "Network:" in line:
-            match = re.search(r'Network:\s*([-\w\s()#]+)', line)
-            if match:
-                network = match.group(1)
-
-        if "Network Scenario:" in line:
-            match = re.search(r'Network Scenario:\s*(\w+)', line)
-            if match:
-                network_scenario = match.group(1)
-
-        if "Inflow:" in line:
-            match = re.search(r'Inflow:\s*.*>\s*([\w\s%]+)', line)
-            if match:
-                inflow = match.group(1)
-                
-        if "Level:" in line:
-            match = re.search(r'Level:\s*.*>\s*([^>]+)', line)
-            if match:
-                level = match.group(1).strip()
-
-        if "Rainfall event:" in line:
-            match = re.search(r'Rainfall event:\s*.*>\s*([^>]+)', line)
-            if match:
-                rainfall_event = match.group(1).strip()
-
-        if "Event details:" in line and event_details is None:
-            match = re.search(r'Event details:\s*(.*)', line)
-            if match:
-                event_details = match.group(1)
-
-        if "Start time -" in line and start_time is None:
-            match = re.search(r'Start time\s*-\s*(.*)', line)
-            if match:
-                start_time = match.group(1)
-
-        if "Requested duration (min) -" in line and requested_duration is None:
-            match = re.search(r'Requested duration \(min\)\s*-\s*(\d+)', line)
-            if match:
-                requested_duration = match.group(1)
-                
-        # Capture the second occurrence of Minimum Element Area
-        if "Minimum element area (m2)" in line:
-            min_element_area_count += 1
-            if min_element_area_count == 2:
-                match = re.search(r'Minimum element area \(m2\)\s*:\s*([\d\.]+)', line)
-                if match:
-                    min_element_area = match.group(1)
-
-        if "Maximum element area (m2)" in line:
-            match = re.search(r'Maximum element area \(m2\)\s*:\s*([\d\.]+)', line)
-            if match:
-                max_element_area = match.group(1)
-
-        if "External Boundary Condition" in line:
-            match = re.search(r'External Boundary Condition\s*:\s*(.*)', line)
-            if match:
-                boundary_condition = match.group(1).strip()
-                
-        if "2d Zone mass error (m3)" in line:
-            match = re.search(r'2d Zone mass error \(m3\)\s*:\s*([\d\.]+)', line)
-            if match:
-                twod_zone_mass_error = match.group(1)
-
-        if "Timestep:" in line:
-            match = re.search(r'Timestep:\s*([\d\.]+min)', line)
-            if match:
-                timestep_value = match.group(1)  # Update timestep_value with the latest match
-
-    return {
-        "InfoWorks ICM version": innovyze_version,
-        "Network": network,
-        "Scenario": network_scenario,
-        "Inflow": inflow,
-        "Level": level,
-        "Rainfall event": rainfall_event,
-        "Event details": event_details,
-        "Minimum Element Area (m2)": min_element_area,
-        "Maximum Element Area (m2)": max_element_area,
-        "External Boundary Condition": boundary_condition,
-        "Start time": start_time,
-        "Requested duration (min)": requested_duration,
-        "VBEP": volume_balance_error,
-        "2D Zone Mass Error (m3)": twod_zone_mass_error,
-        "Elapsed clock time": elapsed_clock_time,
-        "GPU used": "Yes" if gpu_used else "No",
-        "Finish time": timestep_value
-    }
 
-uploaded_file = st.file_uploader("Upload a SIM.log file:", type="log")
+def audit_folder(root, max_vbep, max_zone_mass_error, require_completion, read_whole_logs):
+    log_paths = find_logs(root)
+    if not log_paths:
+        st.warning("No SIM log files were found under the folder.")
+        return
+
+    # Parse all the logs in parallel, reusing them until any of the files change
+    key = ("log audit", read_whole_logs, tuple(file_identity(path) for path in log_paths))
+    infos, errors = results.get_or_compute(key, lambda: read_logs(log_paths, head_tail=not read_whole_logs))
+    for path, error in errors.items():
+        st.error(f"File {os.path.relpath(path, root)} could not be read: {error}.")
+
+    df = pd.DataFrame(audit_logs(infos, max_vbep, max_zone_mass_error, require_completion, root=root))
+    st.subheader("Audit:")
+    if not read_whole_logs:
+        st.info(head_tail_notice)
+    st.write(f"{int(df['Pass'].sum())} of {len(df)} simulations pass.")
+    only_failing = st.checkbox("Show failing simulations only")
+    st.dataframe(df[~df['Pass']] if only_failing else df, hide_index=True)
+    st.download_button(
+        label="Download CSV",
+        data=df.to_csv(index=False),
+        file_name="sim_log_audit.csv",
+        mime="text/csv"
+    )
+
+head_tail_notice = (
+    f"Only the first {HEAD_BYTES // 2**20} MB of the log and the end-of-run fields at its end were read. "
+    "Other fields written later in the log are reported as absent, or with their value from the first "
+    f"{HEAD_BYTES // 2**20} MB. Read the whole log to search all of it."
+)
 
-if uploaded_file is not None:
-    file_content = uploaded_file.read().decode("utf-8")
-    log_info = extract_log_info(file_content)
+def draw_progress(fig, minutes, positions, steps, edges, rates, unit):
+    # Simulated time against the position in the log, the timestep, and the rate of progress
+    fig.set_size_inches(6, 9)
+    ax1, ax2, ax3 = fig.subplots(3, 1)
+    ax1.plot(*downsample(positions / 2**20, minutes))
+    ax1.set_xlabel('Position in log (MB)')
+    ax1.set_ylabel('Simulated time (min)')
+
+    ax2.plot(*downsample(minutes, steps))
+    ax2.set_xlabel('Simulated time (min)')
+    ax2.set_ylabel('Timestep (min)')
+
+    ax3.stairs(rates, edges)
+    ax3.axhline(y=2 * np.median(rates), color='r', linestyle='--')
+    ax3.set_xlabel('Simulated time (min)')
+    ax3.set_ylabel(unit)
+    fig.tight_layout()
+
+def show_progress(trace):
+    minutes, positions, _ = trace.arrays()
+    steps = trace.steps
+    st.write(f"Timestep records: {len(trace)}")
+    if len(trace) < 2:
+        return
+    changes = np.count_nonzero(np.abs(np.diff(steps[1:])) > 1e-9)
+    st.write(f"Timestep changes: {changes}")
+    st.write(f"Smallest timestep: {np.nanmin(steps[1:]):.4g} min")
+    edges, rates, unit = progress_rates(trace)
+    if unit is None:
+        return
+    # Downsampled to a fixed number of points, and reused when the same log is plotted again
+    show_chart(draw_progress, minutes, positions, steps, edges, rates, unit)
+
+mode = st.radio("Select mode:", ["Single log", "Bulk audit"], horizontal=True)
+
+if mode == "Bulk audit":
+    root = st.text_input("Enter the root folder of the simulation results on the server:", value="").strip('"')
+    max_vbep = st.number_input("Maximum |VBEP| (%):", min_value=0.0, value=1.0, step=0.1, format="%.2f")
+    max_zone_mass_error = st.number_input("Optional: maximum 2D zone mass error (m3):", min_value=0.0, value=None, format="%.3f")
+    require_completion = st.checkbox("Fail simulations that did not reach the requested duration", value=True)
+    read_whole_logs = st.checkbox("Read every log in full (slower, finds fields written after their first 4 MB)")
+
+    if not root or not os.path.isdir(root):
+        st.warning("Please enter a valid root folder.")
+    else:
+        audit_folder(root, max_vbep, max_zone_mass_error, require_completion, read_whole_logs)
+    st.stop()
+
+uploaded_file = st.file_uploader("Upload a SIM.log file:", type="log")
+log_path = st.text_input("Or, for very large logs, enter the path of the log file on the server:", value="").strip('"')
+read_whole_log = st.checkbox("Read the whole log (slower, finds fields written after its first 4 MB)")
+trace_progress = st.checkbox("Trace the timestep progress (reads the whole log)")
+
+if log_path and not os.path.isfile(log_path):
+    st.error(f"The file {log_path} does not exist.")
+    st.stop()
+
+log_source = uploaded_file if uploaded_file is not None else log_path or None
+
+if log_source is not None:
+    if trace_progress:
+        # Collect every timestep record in the same pass as the fields, reusing it until the log changes
+        key = ("log trace", file_identity(log_source) if uploaded_file is None else source_digest(log_source))
+        log_info, trace = results.get_or_compute(key, lambda: read_log_trace(log_source))
+    else:
+        # Read the head of the log and then its end backwards, leaving the per-timestep output in the middle unread
+        log_info = read_log_info(log_source, head_tail=not read_whole_log)
+        size = uploaded_file.size if uploaded_file is not None else os.path.getsize(log_path)
+        if not read_whole_log and size > HEAD_BYTES:
+            st.info(head_tail_notice)
     
     # Display additional information
     #st.subheader("Log Information:")
@@ -204,5 +172,16 @@ if uploaded_file is not None:
         st.subheader("Mass Balance:")
         st.write(f"VBEP: {log_info.get('VBEP', 'Not found')}")
         st.write(f"2D Zone Mass Error (m3): {log_info.get('2D Zone Mass Error (m3)', 'Not found')}")
+
+        if trace_progress:
+            st.subheader("Timestep Progress:")
+            show_progress(trace)
+
+    if trace_progress:
+        periods = slow_periods(trace)
+        if periods:
+            st.subheader("Slow Periods:")
+            st.write("Periods of simulated time that ran at least twice as slowly as the median:")
+            st.dataframe(pd.DataFrame(periods), hide_index=True)
 else:
     st.warning("Please upload a log file.")
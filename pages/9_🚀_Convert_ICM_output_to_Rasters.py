@@ -1,6 +1,8 @@
 import streamlit as st
 import os
-import subprocess
+from maup_tools.rasterize import find_zone_shapefiles, numeric_fields, rasterize_shapefiles
+from maup_tools.vectors import parse_area
+from maup_tools.ui import gdal_settings_panel, raster_diagnostics_panel
 
 #st.logo("images/logo.png", icon_image="images/logo.png")
 
@@ -21,45 +23,18 @@ st.sidebar.info(
     """
 )
 
+gdal_settings_panel()
+
 # Title of the application
 st.title("Convert InfoWorks ICM 2D Zones to Depth and Stage Rasters")
 
 st.markdown("""
-    This tool converts InfoWorks ICM "2D Zones.shp" to depth and/or stage GeoTIFF raster/s.  
-    The user has flexibility to choose the cell size.  
+    This tool converts InfoWorks ICM "2D Zones.shp" to depth and/or stage GeoTIFF raster/s, and any other numeric attribute chosen.  
+    The user has flexibility to choose the cell size. Each shapefile is read once for all its rasters, and the folders are processed in parallel.  
     In InfoWorks ICM, the shapefile should be exported using Results > Export Maxima to GIS > To SHP, and with no threshold.  
         
     """)
     
-# Function to rasterize shapefiles to GeoTIFF, using folder names for output filenames
-def rasterize_shapefiles(input_folders, output_folder, raster_types, cell_size):
-    for folder in input_folders:
-        for root, dirs, files in os.walk(folder):
-            for file in files:
-                if file == '2D Zones.shp':
-                    shapefile_path = os.path.join(root, file)
-                    folder_name = os.path.basename(root)
-                    for raster_type in raster_types:
-                        if raster_type == 'DEPTH2D':
-                            output_filename = f"{folder_name}_d_Max.tif"
-                        else:
-                            output_filename = f"{folder_name}_h_Max.tif"
-                        output_tiff_path = os.path.join(output_folder, output_filename)
-                        command = [
-                            "gdal_rasterize",
-                            "-a",
-                            raster_type,
-                            "-tr",
-                            str(cell_size),
-                            str(cell_size),
-                            "-a_nodata",
-                            "-9999",
-                            shapefile_path,
-                            output_tiff_path
-                        ]
-                        subprocess.run(command, check=True)
-    st.success('2D Zones.shp are converted to rasters successfully.')
-
 # Allow user to input the root directory
 root_dir = st.text_input("Enter the root directory containing your input folders:")
 
@@ -87,9 +62,17 @@ else:
 # Raster type selection
 raster_type = st.selectbox('Select the hydraulic parameter that you want to process:', ['DEPTH2D', 'elevation2', 'Both'], index=2)
 
+# Other attributes of the first shapefile found, rasterized in the same pass
+shapefiles = find_zone_shapefiles(input_folders)
+other_fields = [f for f in numeric_fields(shapefiles[0]) if f not in ('DEPTH2D', 'elevation2')] if shapefiles else []
+other_types = st.multiselect('Optional: other attributes to rasterize:', other_fields)
+
 # Cell size selection
 cell_size = st.number_input('Enter cell size:', min_value=0.5, value=2.0, step=0.5, format="%.1f")
 
+# Only the features touching the area of interest are read, onto a raster clipped to it and masked to a polygon
+area_text = st.text_input("Optional: area of interest, as 'minx, miny, maxx, maxy' in the model's coordinates or the path of a polygon file:")
+
 # Process button
 if st.button('Process Shapefile'):
     if not input_folders or not output_folder:
@@ -100,7 +83,14 @@ if st.button('Process Shapefile'):
             rasterize_types = ['DEPTH2D', 'elevation2']
         else:
             rasterize_types = [raster_type]
+        rasterize_types += other_types
         try:
-            rasterize_shapefiles(input_folders, output_folder, rasterize_types, cell_size)
+            outputs = rasterize_shapefiles(input_folders, output_folder, rasterize_types, cell_size, parse_area(area_text))
+            if outputs:
+                st.success('2D Zones.shp are converted to rasters successfully.')
+            else:
+                st.warning('No 2D Zones.shp features were found in the selected folders and area of interest.')
         except Exception as e:
             st.error(f"Error during rasterization: {e}")
+
+raster_diagnostics_panel()
@@ -0,0 +1,36 @@
+import io
+
+import numpy as np
+
+from maup_tools.icm_log import TimestepTrace, scan_log
+
+
+def _log(n_records=2000):
+    """A SIM.log body where only every other timestep line carries a wall clock time."""
+    lines = [b"InfoWorks ICM SIM 2024.2.0", b"Network: Test network"]
+    for i in range(n_records):
+        line = b"Timestep: %.2fmin  Iterations: 2" % (i * 0.5)
+        if i % 2:
+            seconds = 23 * 3600 + 3 * i
+            line += b"  %02d:%02d:%02d" % (seconds // 3600 % 24, seconds // 60 % 60, seconds % 60)
+        lines.append(line)
+    return b"\n".join(lines) + b"\n"
+
+def _trace(log, chunk_size):
+    trace = TimestepTrace()
+    scan_log(io.BytesIO(log), chunk_size, trace=trace)
+    return trace
+
+def test_trace_does_not_depend_on_chunk_size():
+    log = _log()
+    small, large = _trace(log, 4096), _trace(log, len(log) + 1)
+    for small_array, large_array in zip(small.arrays(), large.arrays()):
+        np.testing.assert_array_equal(small_array, large_array)
+    assert np.count_nonzero(~np.isnan(small.arrays()[2])) == 1000
+
+def test_elapsed_counts_time_across_untimed_records():
+    trace = _trace(_log(), 4096)
+    elapsed = trace.elapsed
+    assert np.isnan(elapsed[::2]).all()
+    # The clock passes midnight part way through
+    np.testing.assert_allclose(elapsed[1::2], 6 * np.arange(1000))